@@ -0,0 +1,198 @@
+import importlib.util
+import itertools
+import os
+import platform
+import time
+
+import numpy as np
+import torch
+
+from .datamodule import PhilPageDataset
+from .detector import BACKENDS, Detector, checkpoint_id
+from .model import PhilTableDetection
+from .transforms import get_transforms
+
+COMPILE_MODES = ("eager", "torchscript", "compile")
+GRAD_MODES = ("inference_mode", "no_grad")
+
+
+def available_backends() -> list:
+    """The Detector backends that can run in this environment."""
+    if importlib.util.find_spec("onnxruntime") is None:
+        return ["torch"]
+    return list(BACKENDS)
+
+
+def load_images(paths, model_weights: str) -> torch.Tensor:
+    """Decodes and transforms page images into a single tensor, so that the
+    benchmark measures the model rather than image decoding. Images are resized
+    to the checkpoint's input size, which a multi-objective search may lower."""
+    if not paths:
+        raise ValueError("No images to benchmark")
+    model = PhilTableDetection.load_from_checkpoint(model_weights, map_location="cpu")
+    dataset = PhilPageDataset(paths, get_transforms(tuple(model.image_size)))
+    return torch.stack([dataset[i][0] for i in range(len(dataset))])
+
+
+def torch_runner(
+    model, channels_last=False, compile_mode="eager", grad_mode="inference_mode"
+):
+    """
+    Wraps a PhilTableDetection model in a function that runs one batch under the
+    given settings.
+
+    :param model: A PhilTableDetection model.
+    :param channels_last: Whether to use the channels-last memory format.
+    :param compile_mode: One of COMPILE_MODES: run eagerly, as a frozen TorchScript
+        trace, or through torch.compile.
+    :param grad_mode: One of GRAD_MODES, the autograd context to run under.
+    :return: A function mapping a batch of images to probabilities, returned as
+        Detector.predict_batch returns them so that every backend is timed to the
+        same output.
+    """
+    model.eval()
+    model.requires_grad_(False)
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    model = model.to(memory_format=memory_format)
+
+    if compile_mode == "torchscript":
+        example = torch.zeros(1, 3, *model.image_size).to(memory_format=memory_format)
+        with torch.no_grad():
+            model = torch.jit.freeze(
+                model.to_torchscript(method="trace", example_inputs=example)
+            )
+    elif compile_mode == "compile":
+        model = torch.compile(model)
+
+    grad_context = (
+        torch.inference_mode if grad_mode == "inference_mode" else torch.no_grad
+    )
+
+    def run(batch):
+        batch = batch.contiguous(memory_format=memory_format)
+        with grad_context():
+            logits = model(batch)
+        return torch.sigmoid(logits.view(-1)).float().cpu().numpy()
+
+    return run
+
+
+def measure(run, images: torch.Tensor, batch_size: int, warmup: int = 2) -> dict:
+    """
+    Measures the latency and throughput of a runner over a set of images.
+
+    :param run: A function mapping a batch of images to predictions.
+    :param images: A tensor of transformed images.
+    :param batch_size: The number of images per call to run.
+    :param warmup: The number of batches run before timing starts, which absorbs
+        one-off costs such as compilation and allocator growth.
+    :return: A dictionary of timing statistics.
+    """
+    if len(images) == 0:
+        raise ValueError("No images to benchmark")
+    batches = list(torch.split(images, batch_size))
+    for batch in batches[:warmup]:
+        run(batch)
+
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        run(batch)
+        latencies.append(time.perf_counter() - start)
+
+    seconds = sum(latencies)
+    return {
+        "images": len(images),
+        "seconds": seconds,
+        "images_per_second": len(images) / seconds if seconds else 0.0,
+        "ms_per_image": 1000 * seconds / len(images),
+        "batch_latency_ms_p50": 1000 * float(np.percentile(latencies, 50)),
+        "batch_latency_ms_p95": 1000 * float(np.percentile(latencies, 95)),
+    }
+
+
+def benchmark_matrix(
+    model_weights: str,
+    images: torch.Tensor,
+    batch_sizes=(1, 8, 32),
+    thread_counts=None,
+    backends=None,
+    channels_last_options=(False, True),
+    compile_modes=COMPILE_MODES,
+    grad_modes=GRAD_MODES,
+):
+    """
+    Benchmarks a checkpoint across a matrix of inference settings. Memory format,
+    compilation and grad mode only apply to the torch backend; the ONNX backends
+    are measured across batch sizes and thread counts. A setting that fails, e.g.
+    torch.compile without a C++ toolchain, is recorded with its error.
+
+    :param model_weights: Path to the PhilTableDetection checkpoint.
+    :param images: A tensor of transformed images, see load_images.
+    :param batch_sizes: The batch sizes to measure.
+    :param thread_counts: The torch.set_num_threads values to measure. Defaults to
+        one thread, half the cores and all the cores.
+    :param backends: The Detector backends to measure. Defaults to those available.
+    :param channels_last_options: Whether to measure contiguous and/or channels-last.
+    :param compile_modes: The COMPILE_MODES to measure.
+    :param grad_modes: The GRAD_MODES to measure.
+    :return: A generator of result dictionaries, one per setting.
+    """
+    cores = os.cpu_count() or 1
+    thread_counts = thread_counts or sorted({1, max(1, cores // 2), cores})
+    backends = backends or available_backends()
+
+    for backend, num_threads in itertools.product(backends, thread_counts):
+        torch.set_num_threads(num_threads)
+        if backend == "torch":
+            variants = itertools.product(
+                channels_last_options, compile_modes, grad_modes
+            )
+        else:
+            variants = [(None, None, None)]
+
+        for channels_last, compile_mode, grad_mode in variants:
+            settings = {
+                "backend": backend,
+                "num_threads": num_threads,
+                "channels_last": channels_last,
+                "compile_mode": compile_mode,
+                "grad_mode": grad_mode,
+            }
+            try:
+                if backend == "torch":
+                    model = PhilTableDetection.load_from_checkpoint(
+                        model_weights, map_location="cpu"
+                    )
+                    run = torch_runner(model, channels_last, compile_mode, grad_mode)
+                else:
+                    # sessions read torch's thread count when they are created
+                    run = Detector(model_weights, backend=backend).predict_batch
+            except Exception as e:
+                for batch_size in batch_sizes:
+                    yield {
+                        **settings,
+                        "batch_size": batch_size,
+                        "error": repr(e).splitlines()[0],
+                    }
+                continue
+
+            for batch_size in batch_sizes:
+                try:
+                    result = measure(run, images, batch_size)
+                except Exception as e:
+                    result = {"error": repr(e).splitlines()[0]}
+                yield {**settings, "batch_size": batch_size, **result}
+
+
+def environment(model_weights: str) -> dict:
+    """Describes what a benchmark ran on, so reports can be compared over time."""
+    return {
+        "model_id": checkpoint_id(model_weights),
+        "model_weights": os.path.abspath(model_weights),
+        "torch": torch.__version__,
+        "cpu_count": os.cpu_count(),
+        "processor": platform.processor(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
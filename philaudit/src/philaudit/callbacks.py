@@ -1,16 +1,81 @@
-from pytorch_lightning.callbacks import EarlyStopping, ModelCheckpoint
+import time
 
+import optuna
+import torch
+from pytorch_lightning.callbacks import Callback, EarlyStopping, ModelCheckpoint
 
-def get_callbacks(checkpointdir):
-    [
+
+def get_callbacks(checkpoint_dir):
+    return [
         EarlyStopping(monitor="val_prec", min_delta=0.005, patience=3),
         EarlyStopping(monitor="val_loss", min_delta=0.005, patience=3),
         ModelCheckpoint(
-            dirpath=checkpointdir,
+            dirpath=checkpoint_dir,
             monitor="val_loss",
             save_top_k=1,
-            filename="{epoch}-{val_loss:.2f}-{val_prec:.2f}-{val_acc:.2f}-{val_rec:.2f}",
+            filename="{epoch}-{val_loss:.2f}-{val_prec:.2f}-{val_acc:.2f}-{val_recall:.2f}",
             mode="min",
             every_n_epochs=3,
         ),
     ]
+
+
+class OptunaPruningCallback(Callback):
+    """Reports a validation metric to an Optuna trial after every validation
+    epoch and stops the trial once the study's pruner decides it will not beat
+    the trials before it."""
+
+    def __init__(self, trial, monitor="val_loss"):
+        super().__init__()
+        self.trial = trial
+        self.monitor = monitor
+
+    def on_validation_end(self, trainer, pl_module):
+        # the sanity check runs before the first epoch and is not a result
+        if trainer.sanity_checking:
+            return
+        score = trainer.callback_metrics.get(self.monitor)
+        if score is None:
+            return
+        epoch = trainer.current_epoch
+        self.trial.report(float(score), step=epoch)
+        if self.trial.should_prune():
+            raise optuna.TrialPruned(f"Trial was pruned at epoch {epoch}.")
+
+
+class ChannelsLast(Callback):
+    """Converts the model's weights to the channels-last memory format before
+    training. Convolutions then run channels-last, which is faster on recent
+    CPUs and on tensor core GPUs, converting contiguous inputs as needed."""
+
+    def on_fit_start(self, trainer, pl_module):
+        pl_module.to(memory_format=torch.channels_last)
+
+
+class SamplesPerSecond(Callback):
+    """Measures training throughput and logs it as `train_samples_per_sec` at the
+    end of every epoch. The first batch of each epoch is not timed, so worker
+    start-up and one-off allocations do not count against it."""
+
+    def __init__(self):
+        super().__init__()
+        self.samples_per_second = None
+        self._start = None
+        self._samples = 0
+
+    def on_train_epoch_start(self, trainer, pl_module):
+        self._start = None
+        self._samples = 0
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx):
+        if self._start is None:
+            self._start = time.perf_counter()
+            return
+        self._samples += len(batch[0])
+        seconds = time.perf_counter() - self._start
+        if seconds > 0:
+            self.samples_per_second = self._samples / seconds
+
+    def on_train_epoch_end(self, trainer, pl_module):
+        if self.samples_per_second is not None:
+            pl_module.log("train_samples_per_sec", self.samples_per_second)
@@ -1,13 +1,18 @@
+import json
+import os
 from typing import Union
 
 import albumentations as album
 import numpy as np
 import pytorch_lightning as pl
 import torch
-from torch.utils.data import DataLoader, Dataset, random_split
+from PIL import Image
+from torch.utils.data import DataLoader, Dataset, Subset, random_split
 from torchvision.datasets import ImageFolder
+from torchvision.datasets.folder import default_loader
 
-from .transforms import DEFAULT_TRANSFORMS
+from .splits import SPLITS, read_split_manifest
+from .transforms import DEFAULT_TRANSFORMS, IMAGE_SIZE
 
 
 # Implementing a custom dataset with a __getitem__ method allows us to apply
@@ -32,6 +37,138 @@ class PhilImageDataset(Dataset):
         return image, label
 
 
+# Unlabelled page images for inference. Decoding and transforming happen in
+# __getitem__, so a DataLoader spreads that work across its worker processes.
+class PhilPageDataset(Dataset):
+    def __init__(
+        self, paths, transforms: Union[album.Compose, None] = DEFAULT_TRANSFORMS
+    ):
+        self.paths = paths
+        self.transforms = transforms
+
+    def __len__(self):
+        """Dataset Length."""
+        return len(self.paths)
+
+    def __getitem__(self, idx):
+        """Returns the transformed image and whether it could be read. Unreadable
+        images are replaced by a blank image so they do not break the batch."""
+        readable = True
+        try:
+            with Image.open(self.paths[idx]) as img:
+                image = np.asarray(img.convert("RGB"))
+        except Exception as e:
+            print(f"Error opening image {self.paths[idx]}: {e}")
+            # a blank page, transformed to the same size as the rest of the batch
+            image = np.zeros((*IMAGE_SIZE, 3), dtype=np.uint8)
+            readable = False
+        if self.transforms:
+            image = self.transforms(image=image)["image"]
+        return image, readable
+
+
+# Labelled image files listed by a split manifest. Samples are (image, label)
+# like ImageFolder's, without walking the directory tree.
+class PhilFileDataset(Dataset):
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __len__(self):
+        """Dataset Length."""
+        return len(self.samples)
+
+    def __getitem__(self, idx):
+        path, label = self.samples[idx]
+        return default_loader(path), label
+
+
+# Labelled images already decoded and resized to IMAGE_SIZE by build_dataset_cache,
+# read from a memory-mapped array. Samples are (image, label) like ImageFolder's,
+# so PhilImageDataset applies the transforms as usual; Resize is then a no-op.
+class PhilArrayDataset(Dataset):
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, "index.json")) as f:
+            self.index = json.load(f)
+        self.labels = np.load(os.path.join(cache_dir, "labels.npy"))
+        self._images = None
+
+    def __getstate__(self):
+        # each DataLoader worker maps the file itself rather than receiving a copy
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = np.load(
+                os.path.join(self.cache_dir, "images.npy"), mmap_mode="r"
+            )
+        return self._images
+
+    def __len__(self):
+        """Dataset Length."""
+        return len(self.labels)
+
+    def __getitem__(self, idx):
+        return self.images[idx], int(self.labels[idx])
+
+
+def build_dataset_cache(data_root, cache_dir, num_workers=2, batch_size=64):
+    """
+    Decodes and resizes every image under an ImageFolder root once, writing them to
+    a memory-mapped uint8 array with their labels, for PhilArrayDataset. The index
+    is written last, so an interrupted build is never mistaken for a cache.
+    Rebuild the cache after adding labelled images.
+
+    :param data_root: The ImageFolder root, with one folder per class.
+    :param cache_dir: The directory to write images.npy, labels.npy and index.json to.
+    :param num_workers: The number of DataLoader processes decoding images.
+    :param batch_size: The number of images written at a time.
+    :return: The number of cached images.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, "index.json")
+    if os.path.exists(index_path):
+        os.remove(index_path)
+
+    folder = ImageFolder(root=data_root)
+    loader = DataLoader(
+        PhilImageDataset(folder, transforms=album.Resize(*IMAGE_SIZE)),
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+    )
+    images = np.lib.format.open_memmap(
+        os.path.join(cache_dir, "images.npy"),
+        mode="w+",
+        dtype=np.uint8,
+        shape=(len(folder), *IMAGE_SIZE, 3),
+    )
+    idx = 0
+    for batch, _ in loader:
+        images[idx : idx + len(batch)] = batch.numpy()
+        idx += len(batch)
+    images.flush()
+    del images
+
+    np.save(os.path.join(cache_dir, "labels.npy"), np.array(folder.targets))
+    with open(index_path, "w") as f:
+        json.dump(
+            {
+                "data_root": os.path.abspath(data_root),
+                "classes": folder.classes,
+                "image_size": list(IMAGE_SIZE),
+                "samples": [
+                    os.path.relpath(path, data_root) for path, _ in folder.samples
+                ],
+            },
+            f,
+        )
+    return len(folder)
+
+
 class PhilDataModule(pl.LightningDataModule):
     def __init__(
         self,
@@ -42,6 +179,8 @@ class PhilDataModule(pl.LightningDataModule):
         test_split=0.1,
         seed=42,
         transforms=None,
+        cache_dir=None,
+        split_manifest=None,
     ):
         super().__init__()
         self.data_root = data_root
@@ -51,6 +190,8 @@ class PhilDataModule(pl.LightningDataModule):
         self.seed = seed
         self.num_workers = num_workers
         self.transforms = transforms
+        self.cache_dir = cache_dir
+        self.split_manifest = split_manifest
 
     def setup(self, stage=None):
         train_set, val_set, test_set = self._get_dataset_splits()
@@ -58,8 +199,40 @@ class PhilDataModule(pl.LightningDataModule):
         self.val_set = PhilImageDataset(val_set, transforms=self.transforms)
         self.test_set = PhilImageDataset(test_set, transforms=self.transforms)
 
+    def _has_cache(self):
+        return self.cache_dir and os.path.exists(
+            os.path.join(self.cache_dir, "index.json")
+        )
+
+    def _load_cache(self):
+        dataset = PhilArrayDataset(self.cache_dir)
+        if dataset.index["image_size"] != list(IMAGE_SIZE):
+            raise ValueError(
+                f"The dataset cache {self.cache_dir} holds images of size "
+                f"{tuple(dataset.index['image_size'])}, not {IMAGE_SIZE}. "
+                "Rebuild it with build_dataset_cache."
+            )
+        return dataset
+
     def _get_dataset_splits(self):
-        dataset = ImageFolder(root=self.data_root)
+        if self.split_manifest and os.path.exists(self.split_manifest):
+            return self._get_manifest_splits()
+
+        # both list samples in sorted path order, so the splits match
+        if self._has_cache():
+            dataset = self._load_cache()
+            folder = ImageFolder(root=self.data_root)
+            samples = [
+                os.path.relpath(path, self.data_root) for path, _ in folder.samples
+            ]
+            if dataset.index["samples"] != samples:
+                raise ValueError(
+                    f"The {len(dataset)} images in the dataset cache {self.cache_dir} "
+                    f"do not match the {len(samples)} in {self.data_root}. "
+                    "Rebuild it with build_dataset_cache."
+                )
+        else:
+            dataset = ImageFolder(root=self.data_root)
 
         val_size = int(self.val_split * len(dataset))
         test_size = int(self.test_split * len(dataset))
@@ -69,6 +242,39 @@ class PhilDataModule(pl.LightningDataModule):
 
         return random_split(dataset, [train_size, val_size, test_size])
 
+    def _get_manifest_splits(self):
+        # the splits were assigned once by update_split_manifest, see splits.py
+        manifest = read_split_manifest(self.split_manifest)
+        classes = sorted(manifest.label.unique())
+        manifest["target"] = manifest.label.map(classes.index)
+
+        if self._has_cache():
+            dataset = self._load_cache()
+            rows = {path: i for i, path in enumerate(dataset.index["samples"])}
+            missing = manifest.path[~manifest.path.isin(rows)]
+            if len(missing):
+                raise ValueError(
+                    f"{len(missing)} images in {self.split_manifest} are not in the "
+                    f"dataset cache {self.cache_dir}, e.g. {missing.iloc[0]}. "
+                    "Rebuild it with build_dataset_cache."
+                )
+            return [
+                Subset(
+                    dataset, manifest.path[manifest.split == split].map(rows).tolist()
+                )
+                for split in SPLITS
+            ]
+
+        return [
+            PhilFileDataset(
+                [
+                    (os.path.join(self.data_root, row.path), row.target)
+                    for row in manifest[manifest.split == split].itertuples()
+                ]
+            )
+            for split in SPLITS
+        ]
+
     def train_dataloader(self):
         return DataLoader(
             self.train_set,
@@ -1,8 +1,19 @@
+import os
+
 import numpy as np
 import torch
 
+from .export import export_onnx, import_onnx, onnx_paths, quantize_onnx
 from .model import PhilTableDetection
-from .transforms import DEFAULT_TRANSFORMS
+from .prediction_cache import content_hash, file_hash
+from .transforms import get_transforms
+
+BACKENDS = ("torch", "onnxruntime", "quantized")
+
+
+def checkpoint_id(model_weights: str, backend: str = "torch") -> str:
+    """Identifies a checkpoint by its content, and the backend running it."""
+    return f"{file_hash(model_weights)}-{backend}"
 
 
 class Detector:
@@ -15,31 +26,137 @@ class Detector:
     model_weights = "path/to/model/weights.ckpt"
     my_detector = Detector(model_weights)
     prediction = my_detector.detect(image)
+    probabilities = my_detector.detect_batch([image1, image2])
     ```
+
+    The `backend` selects how the model is run: "torch" runs the Lightning
+    module, "onnxruntime" runs an ONNX export of the checkpoint and
+    "quantized" runs its dynamically quantized int8 variant. The ONNX models
+    are exported next to the checkpoint the first time they are needed (see
+    philaudit.export). The ONNX backends require the onnx and onnxruntime
+    packages, e.g. `pip install philaudit[onnx]`.
+
+    With a PredictionCache, probabilities are looked up by page content and
+    model id before the model is run, and new predictions are stored.
+
+    With a prefilter, e.g. a RulingLinePrefilter, pages it rejects are given a
+    probability of 0 without running the model.
     """
 
-    def __init__(self, model_weights):
+    def __init__(self, model_weights, backend="torch", cache=None, prefilter=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+        self.model_weights = model_weights
+        self.backend = backend
         self.map_location = (
             torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
         )
-        self.model = self._load_model(model_weights)
-        self.transforms = DEFAULT_TRANSFORMS
+        self.cache = cache
+        self.prefilter = prefilter
+        self._model_id = None
+        self.model = None
+        self.session = None
+        if backend == "torch":
+            self.model = self._load_model(model_weights)
+            image_size = self.model.image_size
+        else:
+            self.session = self._load_session(model_weights)
+            image_size = self.session.get_inputs()[0].shape[2:]
+        # resize to the resolution the checkpoint was trained at
+        self.transforms = get_transforms(tuple(image_size))
+
+    def __getstate__(self):
+        # onnxruntime sessions cannot be pickled, child processes rebuild them
+        # lazily so that they pick up the child's thread settings
+        state = self.__dict__.copy()
+        state["session"] = None
+        return state
+
+    def share_memory(self):
+        """Move the torch model's weights to shared memory before handing the
+        detector to other processes. The ONNX backends are rebuilt per process."""
+        if self.model is not None:
+            self.model.share_memory()
+        return self
+
+    @property
+    def model_id(self) -> str:
+        """Identifies the checkpoint by its content, and the backend running it."""
+        if self._model_id is None:
+            self._model_id = checkpoint_id(self.model_weights, self.backend)
+        return self._model_id
 
     def detect(self, image):
-        image = self._transform(image)
-        prediction = self._predict(image)
-        return prediction
+        return 1 if self.detect_proba(image) > 0.5 else 0
+
+    def detect_proba(self, image) -> float:
+        """Return the probability that the image contains a target table."""
+        return float(self.detect_batch([image])[0])
+
+    def detect_batch(self, images, keys=None) -> np.ndarray:
+        """Return the probability that each image in a list contains a target table.
+        With a cache, `keys` are the images' content hashes; they default to a
+        hash of the decoded pixels. Pages rejected by the prefilter get 0."""
+        images = [np.asarray(image) for image in images]
+        if self.prefilter is not None:
+            kept = [i for i, image in enumerate(images) if self.prefilter.keep(image)]
+            probabilities = np.zeros(len(images))
+            if kept:
+                probabilities[kept] = self._detect_batch(
+                    [images[i] for i in kept],
+                    None if keys is None else [keys[i] for i in kept],
+                )
+            return probabilities
+        return self._detect_batch(images, keys)
+
+    def _detect_batch(self, images, keys=None) -> np.ndarray:
+        if self.cache is None:
+            return self.predict_batch(torch.stack([self._transform(i) for i in images]))
+
+        if keys is None:
+            keys = [content_hash(image.tobytes()) for image in images]
+        probabilities, missing = self.lookup(keys)
+        if missing:
+            batch = torch.stack([self._transform(images[i]) for i in missing])
+            probabilities[missing] = self.predict_batch(
+                batch, keys=[keys[i] for i in missing]
+            )
+        return probabilities
+
+    def lookup(self, keys):
+        """Return the cached probabilities for a list of content hashes, NaN where
+        there is no entry, and the indices of the keys that were not cached."""
+        cached = self.cache.get_many(keys, self.model_id)
+        probabilities = np.array([cached.get(key, np.nan) for key in keys])
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        return probabilities, missing
+
+    def predict_batch(self, batch, keys=None) -> np.ndarray:
+        """Return the probabilities for a batch that has already been transformed,
+        e.g. by a DataLoader over PhilPageDataset. If `keys` are given and the
+        detector has a cache, the probabilities are stored under them."""
+        probabilities = self._run(batch)
+        if self.cache is not None and keys is not None:
+            self.cache.put_many(keys, probabilities, self.model_id)
+        return probabilities
+
+    def _run(self, batch) -> np.ndarray:
+        if self.backend != "torch":
+            if self.session is None:
+                self.session = self._load_session(self.model_weights)
+            logits = self.session.run(None, {"input": batch.numpy()})[0]
+            return 1 / (1 + np.exp(-logits.reshape(-1)))
+        batch = batch.to(self.map_location)
+        with torch.inference_mode():
+            logits = self.model(batch)
+        return torch.sigmoid(logits.view(-1)).float().cpu().numpy()
 
     def _transform(self, image):
         image = np.asarray(image)
+        if image.ndim == 2:  # grayscale renders, the model expects 3 channels
+            image = np.stack([image] * 3, axis=-1)
         return self.transforms(image=image)["image"]
 
-    def _predict(self, image):
-        image = image.unsqueeze(0)  # Add an extra dimension for the batch size
-        logit = self.model(image)
-        prediction = torch.sigmoid(logit)
-        return 1 if prediction[0][0] > 0.5 else 0
-
     def _load_model(self, model_weights):
         model = PhilTableDetection.load_from_checkpoint(
             model_weights, map_location=self.map_location
@@ -47,3 +164,23 @@ class Detector:
         model.eval()
         model.requires_grad_(False)
         return model
+
+    def _load_session(self, model_weights):
+        ort = import_onnx("onnxruntime")
+
+        if model_weights.endswith(".onnx"):
+            onnx_path = model_weights
+        else:
+            paths = onnx_paths(model_weights)
+            onnx_path = paths[self.backend]
+            if not os.path.exists(paths["onnxruntime"]):
+                export_onnx(model_weights, paths["onnxruntime"])
+            if self.backend == "quantized" and not os.path.exists(onnx_path):
+                quantize_onnx(paths["onnxruntime"], onnx_path)
+
+        options = ort.SessionOptions()
+        # follow torch's thread setting so callers only tune one knob
+        options.intra_op_num_threads = torch.get_num_threads()
+        return ort.InferenceSession(
+            onnx_path, options, providers=["CPUExecutionProvider"]
+        )
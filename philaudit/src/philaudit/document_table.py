@@ -1,6 +1,7 @@
 import logging
 import re
 
+import numpy as np
 import pandas as pd
 
 ADDITIONAL_COLUMNS = [
@@ -19,7 +20,7 @@ ADDITIONAL_COLUMNS = [
 
 
 class DocumentTable:
-    def __init__(self, table_list: list, text_normalizer):
+    def __init__(self, table_list, text_normalizer):
         self.table_list = table_list
         self._doctable = None
         self._overflow_indices = None
@@ -27,11 +28,19 @@ class DocumentTable:
         self.logger = logging.getLogger(__name__)
 
     def _create_doc_table(self) -> pd.DataFrame:
-        """Create a table of all tables in the document."""
+        """
+        Create a table of all tables in the document. The table list may be a
+        stream, e.g. TableExtractor.iter_tables, of which only each table's
+        cells are kept.
+        """
         if self.table_list is None:
             self.logger.error("Table list is not provided.")
             return None
-        return pd.concat([table.df for table in self.table_list], ignore_index=True)
+        frames = [table.df for table in self.table_list]
+        if not frames:
+            self.logger.info("Table list is empty.")
+            return None
+        return pd.concat(frames, ignore_index=True)
 
     def _data_in_headers(self, headers) -> bool:
         return any(
@@ -39,13 +48,15 @@ class DocumentTable:
         )  # NOTE: hard coded value 83 is an estimate
 
     def _set_headers(self) -> list:
-        headers = self._doctable.iloc[0].to_list()
+        header_row = self._doctable.iloc[0]
+        headers = header_row.to_list()
         if not self._data_in_headers(headers):
-            to_drop = []
-            for i, row in self._doctable.iterrows():
-                if row.to_list() == headers:
-                    to_drop.append(i)
-            self._doctable = self._doctable.drop(index=to_drop)
+            # drop every repeat of the header row, e.g. one per page; empty
+            # cells match empty cells
+            matches = self._doctable.eq(header_row) | (
+                self._doctable.isna() & header_row.isna()
+            )
+            self._doctable = self._doctable.loc[~matches.all(axis=1)]
             self._doctable = self._doctable.reset_index(drop=True)
         else:
             headers = [str(x) for x in range(len(self._doctable.columns))]
@@ -60,7 +71,7 @@ class DocumentTable:
             return None
         headers = self._set_headers()
         self._doctable = self._overflow_repair()
-        self._doctable = self._doctable.map(self.text_normalizer.normalize)
+        self._doctable = self.text_normalizer.normalize_frame(self._doctable)
         self._doctable.columns = [
             self.text_normalizer.normalize(headers) for headers in headers
         ]
@@ -75,19 +86,23 @@ class DocumentTable:
         """Property to get the document table."""
         if self._doctable is None:
             self._doctable = self._create_doc_table()
-            self._doctable = self._clean_doc_table()
+            if self._doctable is not None:
+                self._doctable = self._clean_doc_table()
         return self._doctable
 
     def _overflow_repair(self) -> pd.DataFrame:
         overflow_indices = self._get_overflow_indices()
-        cols = self._doctable.columns.tolist()
-        for i in overflow_indices:
-            if i == 0:  # Skip the first row, can't be overflow
-                continue
-            try:
-                self._doctable.loc[i - 1, cols] += " " + self._doctable.loc[i, cols]
-            except:
-                raise f"Error at index {i}"
+        overflow = self._doctable.index.isin(overflow_indices)
+        # Each run of overflow rows is appended, in order, to the row above it.
+        # Overflow rows before the first kept row have nowhere to go.
+        if overflow[1:].any():
+            groups = np.cumsum(~overflow)  # the kept row each row belongs to
+            runs = np.isin(groups, groups[overflow])
+            joined = (
+                self._doctable[runs].astype(object).groupby(groups[runs]).agg(" ".join)
+            )
+            targets = np.flatnonzero(runs & ~overflow)
+            self._doctable.iloc[targets] = joined.loc[groups[targets]].to_numpy()
         self._doctable = self._doctable.drop(index=overflow_indices)
         return self._doctable
 
@@ -100,15 +115,17 @@ class DocumentTable:
     def _find_regex_overflow(self) -> list:
         indicies = []
         observation_col = self._find_observation_col()  # TODO: make this more robust
-        self._doctable["distinct"] = self._doctable[observation_col].apply(
-            is_distinct_audit
+        # is_distinct_audit over the whole column at once
+        is_distinct = (
+            self._doctable[observation_col]
+            .astype(str)
+            .str[:8]
+            .str.contains(distinct_search_re)
+            .to_numpy(dtype=bool)
         )
-        distinct = self._doctable.distinct.sum()
+        distinct = is_distinct.sum()
         if distinct > 1 and distinct != len(self._doctable):
-            indicies.extend(
-                self._doctable.loc[self._doctable.distinct == False].index.tolist()
-            )
-        self._doctable = self._doctable.drop(columns=["distinct"])
+            indicies.extend(self._doctable.index[~is_distinct].tolist())
         return indicies
 
     def _find_observation_col(self) -> str:
@@ -116,6 +133,8 @@ class DocumentTable:
 
 
 distinct_re = re.compile(r"(\d+\.)|(\)\s)|(\s\d+\s)|(\d+\s+)")
+# the same pattern without groups, which str.contains would warn about
+distinct_search_re = re.compile(r"\d+\.|\)\s|\s\d+\s|\d+\s+")
 
 
 def is_distinct_audit(string):
@@ -0,0 +1,130 @@
+import importlib
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader
+
+from .datamodule import PhilPageDataset
+from .model import PhilTableDetection
+
+
+def import_onnx(module: str = "onnxruntime"):
+    """
+    Imports one of the optional packages behind the ONNX backends, explaining
+    how to install them if it is missing.
+
+    :param module: The module to import, e.g. "onnx" or "onnxruntime.quantization".
+    :return: The imported module.
+    """
+    try:
+        return importlib.import_module(module)
+    except ImportError as e:
+        raise ImportError(
+            f"The ONNX backends need {module.split('.')[0]}. Install the onnx "
+            "extra with `pip install philaudit[onnx]`, or onnx and onnxruntime."
+        ) from e
+
+
+def onnx_paths(model_weights: str) -> dict:
+    """
+    Returns where the exported models for a checkpoint live: next to it,
+    e.g. weights.ckpt -> weights.onnx and weights.int8.onnx.
+
+    :param model_weights: Path to the PhilTableDetection checkpoint.
+    :return: A dictionary with the "onnxruntime" and "quantized" model paths.
+    """
+    stem = os.path.splitext(model_weights)[0]
+    return {"onnxruntime": f"{stem}.onnx", "quantized": f"{stem}.int8.onnx"}
+
+
+def export_onnx(model_weights: str, onnx_path: str, opset_version: int = 17) -> str:
+    """
+    Exports a PhilTableDetection checkpoint to ONNX with a dynamic batch dimension.
+
+    :param model_weights: Path to the PhilTableDetection checkpoint.
+    :param onnx_path: Path to write the ONNX model to.
+    :param opset_version: The ONNX opset to export with.
+    :return: The path of the ONNX model.
+    """
+    import_onnx("onnx")
+    model = PhilTableDetection.load_from_checkpoint(model_weights, map_location="cpu")
+    model.eval()
+    input_sample = torch.zeros(1, 3, *model.image_size)
+    model.to_onnx(
+        onnx_path,
+        input_sample,
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset_version,
+    )
+    return onnx_path
+
+
+def quantize_onnx(onnx_path: str, quantized_path: str) -> str:
+    """
+    Dynamically quantizes an exported ONNX model's weights to int8. Activations are
+    quantized on the fly at inference time, so no calibration data is needed.
+
+    :param onnx_path: Path to the float ONNX model.
+    :param quantized_path: Path to write the int8 model to.
+    :return: The path of the int8 model.
+    """
+    quantization = import_onnx("onnxruntime.quantization")
+    quantization.quantize_dynamic(
+        onnx_path, quantized_path, weight_type=quantization.QuantType.QInt8
+    )
+    return quantized_path
+
+
+def export_all(model_weights: str) -> dict:
+    """
+    Exports a checkpoint to ONNX and quantizes it, writing both next to the checkpoint.
+
+    :param model_weights: Path to the PhilTableDetection checkpoint.
+    :return: The dictionary of model paths from onnx_paths.
+    """
+    paths = onnx_paths(model_weights)
+    export_onnx(model_weights, paths["onnxruntime"])
+    quantize_onnx(paths["onnxruntime"], paths["quantized"])
+    return paths
+
+
+def compare_backends(
+    reference, candidate, paths, batch_size=32, num_workers=2, threshold=0.5
+) -> dict:
+    """
+    Measures how far a candidate Detector's probabilities drift from a reference
+    Detector's, typically the float torch model, on the same images.
+
+    :param reference: The Detector treated as ground truth.
+    :param candidate: The Detector being checked.
+    :param paths: A list of image paths, e.g. a validation folder.
+    :param batch_size: The number of images per forward pass.
+    :param num_workers: The number of DataLoader processes decoding images.
+    :param threshold: The probability above which a page is included.
+    :return: A dictionary of drift statistics.
+    """
+    loader = DataLoader(
+        PhilPageDataset(paths, transforms=reference.transforms),
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+    )
+    expected, actual = [], []
+    for batch, _ in loader:
+        expected.append(reference.predict_batch(batch))
+        actual.append(candidate.predict_batch(batch))
+    expected = np.concatenate(expected) if expected else np.zeros(0)
+    actual = np.concatenate(actual) if actual else np.zeros(0)
+
+    drift = np.abs(expected - actual)
+    flipped = int(((expected > threshold) != (actual > threshold)).sum())
+    return {
+        "images": len(expected),
+        "max_abs_diff": float(drift.max()) if len(drift) else 0.0,
+        "mean_abs_diff": float(drift.mean()) if len(drift) else 0.0,
+        "flipped": flipped,
+        "agreement": 1 - flipped / len(expected) if len(expected) else 1.0,
+    }
@@ -8,13 +8,28 @@ from philaudit.text_normalizer import TextNormalizer
 
 
 class Extractor:
-    def __init__(self, pdf_path: str, pages: str):
+    """
+    Builds a document's cleaned table from its target pages. Nothing is parsed
+    until doctable is read, and the pages are then streamed into it one at a
+    time, so only the tables' cells are held in memory. Pass the same
+    text_normalizer to the Extractors of many documents to share its memo of
+    normalized cells between them.
+    """
+
+    def __init__(
+        self,
+        pdf_path: str,
+        pages: str,
+        workers: int = 1,
+        cache=None,
+        text_normalizer=None,
+    ):
         self.path = pdf_path
         self.pages = pages
-        self.text_normalizer = TextNormalizer()
-        self.table_extractor = TableExtractor(pdf_path, pages)
+        self.text_normalizer = text_normalizer or TextNormalizer()
+        self.table_extractor = TableExtractor(pdf_path, pages, workers, cache)
         self.doc_table_creator = DocumentTable(
-            self.table_extractor.table_list, self.text_normalizer
+            self.table_extractor.iter_tables(), self.text_normalizer
         )
         self.logger = logging.getLogger(__name__)
 
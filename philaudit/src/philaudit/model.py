@@ -116,47 +116,39 @@ class PhilTableDetection(pl.LightningModule):
     def forward(self, x):
         x = self.dropout1(self.pool1(self.bn1(self.rel1(self.conv1(x)))))
         x = self.dropout2(self.pool2(self.bn2(self.rel2(self.conv2(x)))))
-        x = x.view(x.size(0), -1)  # Flatten the input tensor
+        # flatten copies channels-last inputs rather than failing like view
+        x = torch.flatten(x, 1)
         x = self.dropout3(self.rel3(self.fc1(x)))
         x = self.fc2(x)
         return x
 
     def training_step(self, batch, batch_idx):
         inputs, targets = batch
-        inputs.to(self.device), targets.to(self.device)
         logits = self(inputs)  # logits get turned to HalfTensor so vvv
         loss = self.loss_function(logits.view(-1), targets.to(logits.dtype))
         return loss
 
     def validation_step(self, batch, batch_idx):
-        inputs, targets = batch
-        inputs.to(self.device), targets.to(self.device)
-        logits = self(inputs)
-        loss = self.loss_function(logits.view(-1), targets.to(logits.dtype))
-        preds = (torch.sigmoid(logits.view(-1)) > 0.5).type(torch.FloatTensor)
-
-        acc = self.acc(preds, targets.type(torch.FloatTensor))
-        rec = self.rec(preds, targets.type(torch.FloatTensor))
-        prec = self.prec(preds, targets.type(torch.FloatTensor))
-
-        self.log_dict(
-            {"val_loss": loss, "val_acc": acc, "val_prec": prec, "val_recall": rec},
-            prog_bar=True,
-        )
+        self._evaluate(batch)
 
     def test_step(self, batch, batch_idx):
+        self._evaluate(batch)
+
+    def _evaluate(self, batch):
+        # predictions and targets stay on the model's device; the metrics
+        # accumulate their state there and are computed once per epoch
         inputs, targets = batch
-        inputs.to(self.device), targets.to(self.device)
         logits = self(inputs)
         loss = self.loss_function(logits.view(-1), targets.to(logits.dtype))
-        preds = (torch.sigmoid(logits.view(-1)) > 0.5).type(torch.FloatTensor)
+        preds = torch.sigmoid(logits.view(-1)) > 0.5
 
-        acc = self.acc(preds, targets.type(torch.FloatTensor))
-        rec = self.rec(preds, targets.type(torch.FloatTensor))
-        prec = self.prec(preds, targets.type(torch.FloatTensor))
+        self.acc.update(preds, targets)
+        self.rec.update(preds, targets)
+        self.prec.update(preds, targets)
 
+        self.log("val_loss", loss, prog_bar=True, batch_size=len(targets))
         self.log_dict(
-            {"val_loss": loss, "val_acc": acc, "val_prec": prec, "val_recall": rec},
+            {"val_acc": self.acc, "val_prec": self.prec, "val_recall": self.rec},
             prog_bar=True,
         )
 
@@ -0,0 +1,45 @@
+def parse_page_string(s: str) -> list:
+    """
+    Expands a string of page ranges, as written to the metadata `pages` column,
+    into a sorted list of page numbers.
+
+    :param s: A string of page numbers or ranges, e.g. "1-10, 11, 13-15".
+    :return: A sorted list of the individual pages represented by the string.
+    """
+    if not isinstance(s, str) or s.strip() == "":
+        return []
+    pages = set()
+    for part in s.split(","):
+        bounds = part.strip().split("-")
+        start, end = int(bounds[0]), int(bounds[-1])
+        pages.update(range(start, end + 1))
+    return sorted(pages)
+
+
+def contiguous_ranges(pages) -> list:
+    """
+    Groups page numbers into inclusive (first, last) ranges of consecutive pages.
+
+    :param pages: An iterable of page numbers.
+    :return: A list of (first, last) tuples in page order.
+    """
+    ranges = []
+    for page in sorted(set(pages)):
+        if ranges and page == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], page)
+        else:
+            ranges.append((page, page))
+    return ranges
+
+
+def format_page_string(pages) -> str:
+    """
+    Formats page numbers as a string of page ranges, the inverse of parse_page_string.
+
+    :param pages: An iterable of page numbers.
+    :return: A string of page ranges, e.g. "1-10, 13-15".
+    """
+    return ", ".join(
+        f"{first}-{last}" if first != last else str(first)
+        for first, last in contiguous_ranges(pages)
+    )
@@ -0,0 +1,166 @@
+import hashlib
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+def content_hash(data: bytes) -> str:
+    """Hash raw bytes, e.g. a PNG file or a decoded pixel array."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hash a file's contents without reading it into memory at once."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(paths, max_workers: int = 8) -> list:
+    """Hash many files concurrently. hashlib releases the GIL, so threads suffice."""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(file_hash, paths))
+
+
+class PredictionCache:
+    """
+    An on-disk SQLite cache of detector probabilities keyed by page content hash
+    and model id, so pages whose bytes and checkpoint have not changed are never
+    classified twice. When the cache grows past `max_entries`, the least recently
+    used tenth is evicted. Hits and misses are counted per instance.
+
+    The connection is opened lazily, so a cache can be handed to worker processes,
+    which each open their own. WAL mode lets those processes read while another
+    writes.
+    Example:
+    ```
+    cache = PredictionCache("path/to/PhilAuditStorage/prediction_cache.sqlite")
+    detector = Detector(model_weights, cache=cache)
+    ```
+    """
+
+    def __init__(self, path: str, max_entries: int = 5_000_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._entries = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "content_hash TEXT NOT NULL, "
+                "model_id TEXT NOT NULL, "
+                "probability REAL NOT NULL, "
+                "last_used REAL NOT NULL, "
+                "PRIMARY KEY (content_hash, model_id))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS predictions_last_used "
+                "ON predictions (last_used)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, keys, model_id: str) -> dict:
+        """
+        Look up cached probabilities.
+
+        :param keys: A list of content hashes.
+        :param model_id: The id of the model that made the predictions.
+        :return: A dictionary mapping each cached key to its probability.
+        """
+        found = {}
+        for i in range(0, len(keys), _QUERY_CHUNK):
+            chunk = keys[i : i + _QUERY_CHUNK]
+            rows = self.conn.execute(
+                "SELECT content_hash, probability FROM predictions "
+                f"WHERE model_id = ? AND content_hash IN ({','.join('?' * len(chunk))})",
+                [model_id, *chunk],
+            )
+            found.update(rows)
+
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE predictions SET last_used = ? "
+                "WHERE content_hash = ? AND model_id = ?",
+                [(now, key, model_id) for key in found],
+            )
+            self.conn.commit()
+
+        hits = sum(key in found for key in keys)
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, keys, probabilities, model_id: str):
+        """
+        Store probabilities, evicting the least recently used entries if the cache is full.
+
+        :param keys: A list of content hashes. Entries whose key is None are not stored.
+        :param probabilities: The probability predicted for each key.
+        :param model_id: The id of the model that made the predictions.
+        """
+        now = time.time()
+        rows = [
+            (key, model_id, float(probability), now)
+            for key, probability in zip(keys, probabilities)
+            if key is not None
+        ]
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)", rows
+        )
+        self.conn.commit()
+
+        # recount only occasionally; the running total over-estimates on replacements
+        if self._entries is None:
+            self._entries = self.count()
+        else:
+            self._entries += len(rows)
+        if self._entries > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the cache is at 90% of max_entries."""
+        excess = self.count() - int(self.max_entries * 0.9)
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM predictions WHERE rowid IN "
+                "(SELECT rowid FROM predictions ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+            self.conn.commit()
+        self._entries = self.count()
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self.count(),
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,61 @@
+import os
+import re
+
+import pandas as pd
+
+PREDICTION_COLUMNS = ["identifier", "page", "probability", "model_id", "image"]
+
+
+def parse_image_name(image: str) -> tuple:
+    """
+    Splits a page image's file name, e.g. "REGION_Name_page_12.png", into its
+    document identifier and page number.
+
+    :param image: The image's file name or path.
+    :return: A tuple of (identifier, page).
+    """
+    stem = os.path.splitext(os.path.basename(image))[0]
+    identifier, page = stem.rsplit("_page_", 1)
+    # files downloaded twice may carry a "(1)" suffix, see map_images_to_pdfs.py
+    return identifier, int(re.sub(r"\(\d+\)", "", page))
+
+
+def predictions_frame(records, model_id: str) -> pd.DataFrame:
+    """
+    Builds a prediction manifest from (image, probability) records. Unreadable
+    images are recorded with a NaN probability, which no threshold includes.
+
+    :param records: An iterable of (image file name, probability) tuples.
+    :param model_id: The id of the model that made the predictions.
+    :return: A DataFrame with PREDICTION_COLUMNS.
+    """
+    rows = [
+        (*parse_image_name(image), probability, model_id, image)
+        for image, probability in records
+    ]
+    return pd.DataFrame(rows, columns=PREDICTION_COLUMNS)
+
+
+def write_predictions(df: pd.DataFrame, path: str):
+    """Writes a prediction manifest to Parquet."""
+    df.to_parquet(path, index=False)
+
+
+def read_predictions(path: str) -> pd.DataFrame:
+    """Reads a prediction manifest written by write_predictions."""
+    return pd.read_parquet(path)
+
+
+def included_pages(predictions: pd.DataFrame, threshold: float) -> dict:
+    """
+    Applies a threshold to a prediction manifest.
+
+    :param predictions: A prediction manifest.
+    :param threshold: The probability above which a page is included.
+    :return: A dictionary mapping each identifier to its sorted included pages.
+    """
+    included = predictions[predictions.probability > threshold]
+    return {
+        identifier: sorted(pages)
+        for identifier, pages in included.groupby("identifier").page
+    }
@@ -0,0 +1,153 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+class RulingLinePrefilter:
+    """
+    A cheap first stage ahead of PhilTableDetection. The target tables are lattice
+    tables with dense horizontal and vertical rules, while most pages of an audit
+    report are prose. Rules are found the way camelot's lattice parser finds them:
+    an adaptive threshold followed by morphological opening with long, thin
+    kernels, here on a page downscaled to `width` pixels.
+
+    Each direction is scored by its total rule length, measured in page widths
+    for horizontal rules and page heights for vertical rules. A page is passed on
+    to the model only if both scores reach their minimum. The defaults are meant to
+    be conservative; check them against labelled pages with
+    scripts/prefilter_report.py before relying on them.
+    Example:
+    ```
+    prefilter = RulingLinePrefilter()
+    detector = Detector(model_weights, prefilter=prefilter)
+    ```
+    """
+
+    def __init__(
+        self,
+        min_horizontal: float = 1.0,
+        min_vertical: float = 0.2,
+        width: int = 600,
+        line_scale: int = 15,
+    ):
+        self.min_horizontal = min_horizontal
+        self.min_vertical = min_vertical
+        self.width = width
+        self.line_scale = line_scale
+
+    def scores(self, image) -> tuple:
+        """
+        Measures the ruling lines on a page.
+
+        :param image: A page as a numpy array or PIL image, in RGB or grayscale.
+        :return: A tuple of (horizontal, vertical) rule lengths.
+        """
+        image = np.asarray(image)
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        height = max(1, round(image.shape[0] * self.width / image.shape[1]))
+        image = cv2.resize(image, (self.width, height), interpolation=cv2.INTER_AREA)
+
+        # same thresholding as camelot's lattice parser: rules become white on black
+        binary = cv2.adaptiveThreshold(
+            np.invert(image),
+            255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY,
+            15,
+            -2,
+        )
+        horizontal_kernel = cv2.getStructuringElement(
+            cv2.MORPH_RECT, (max(1, self.width // self.line_scale), 1)
+        )
+        vertical_kernel = cv2.getStructuringElement(
+            cv2.MORPH_RECT, (1, max(1, height // self.line_scale))
+        )
+        horizontal = cv2.morphologyEx(binary, cv2.MORPH_OPEN, horizontal_kernel)
+        vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, vertical_kernel)
+        return (
+            cv2.countNonZero(horizontal) / self.width,
+            cv2.countNonZero(vertical) / height,
+        )
+
+    def keep(self, image) -> bool:
+        """Whether a page may contain a lattice table and should reach the model."""
+        horizontal, vertical = self.scores(image)
+        return horizontal >= self.min_horizontal and vertical >= self.min_vertical
+
+    def keep_path(self, path: str) -> bool:
+        """Like keep, for an image file. Unreadable files are kept, so that the
+        model stage reports them as it would without a prefilter."""
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        return True if image is None else self.keep(image)
+
+    def keep_paths(self, paths, max_workers: int = 8) -> list:
+        """Screen many image files concurrently. OpenCV releases the GIL while
+        decoding and filtering, so threads suffice."""
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(self.keep_path, paths))
+
+    def score_paths(self, paths, max_workers: int = 8) -> list:
+        """Measure the ruling lines of many image files, NaN where unreadable."""
+
+        def score(path):
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            return (np.nan, np.nan) if image is None else self.scores(image)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(score, paths))
+
+
+def evaluate_prefilter(
+    prefilter: RulingLinePrefilter, include_paths, exclude_paths, max_workers=8
+) -> dict:
+    """
+    Measures a prefilter on labelled pages, e.g. the Include and Exclude folders
+    after manual review. Recall is the share of table pages passed on to the
+    model, which should be 1.0; the rejection rate is the share of other pages
+    the model no longer has to see.
+
+    :param prefilter: The RulingLinePrefilter to evaluate.
+    :param include_paths: Paths of pages containing target tables.
+    :param exclude_paths: Paths of pages without target tables.
+    :param max_workers: The number of threads screening pages.
+    :return: A dictionary of recall, rejection and throughput statistics, and the
+        pages containing tables that were wrongly rejected.
+    """
+    paths = list(include_paths) + list(exclude_paths)
+    start = time.perf_counter()
+    scores = prefilter.score_paths(paths, max_workers=max_workers)
+    seconds = time.perf_counter() - start
+
+    scores = np.array(scores, dtype=float).reshape(-1, 2)
+    readable = ~np.isnan(scores).any(axis=1)
+    kept = ~readable | (
+        (scores[:, 0] >= prefilter.min_horizontal)
+        & (scores[:, 1] >= prefilter.min_vertical)
+    )
+    positive = np.arange(len(paths)) < len(include_paths)
+    positive_scores = scores[positive & readable]
+
+    return {
+        "min_horizontal": prefilter.min_horizontal,
+        "min_vertical": prefilter.min_vertical,
+        "include": int(positive.sum()),
+        "exclude": int((~positive).sum()),
+        "recall": float(kept[positive].mean()) if positive.any() else 1.0,
+        "rejection_rate": (
+            float((~kept[~positive]).mean()) if (~positive).any() else 0.0
+        ),
+        "images_per_second": len(paths) / seconds if seconds else 0.0,
+        # the largest minimums that would still keep every table page
+        "safe_min_horizontal": (
+            float(positive_scores[:, 0].min()) if len(positive_scores) else None
+        ),
+        "safe_min_vertical": (
+            float(positive_scores[:, 1].min()) if len(positive_scores) else None
+        ),
+        "false_rejections": [
+            path for path, p, k in zip(paths, positive, kept) if p and not k
+        ],
+    }
@@ -0,0 +1,138 @@
+import hashlib
+import os
+
+import pandas as pd
+from torchvision.datasets.folder import IMG_EXTENSIONS
+
+from .predictions import parse_image_name
+
+SPLITS = ("train", "val", "test")
+SPLIT_COLUMNS = ["path", "label", "document", "split"]
+
+
+def stable_hash(key: str) -> float:
+    """Maps a string to a number in [0, 1) that is the same on every machine and run."""
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+def source_document(image: str) -> str:
+    """The identifier of the PDF a page image was rendered from, or the file's stem
+    for images not named like "REGION_Name_page_12.png"."""
+    try:
+        return parse_image_name(image)[0]
+    except ValueError:
+        return os.path.splitext(os.path.basename(image))[0]
+
+
+def scan_images(data_root: str) -> pd.DataFrame:
+    """
+    Lists the labelled images under an ImageFolder root, one folder per class.
+
+    :param data_root: The ImageFolder root.
+    :return: A DataFrame of each image's path relative to data_root, label and document.
+    """
+    rows = []
+    for label in sorted(os.listdir(data_root)):
+        class_root = os.path.join(data_root, label)
+        if not os.path.isdir(class_root):
+            continue
+        for dirpath, _, files in os.walk(class_root):
+            for name in sorted(files):
+                if name.lower().endswith(IMG_EXTENSIONS):
+                    path = os.path.relpath(os.path.join(dirpath, name), data_root)
+                    rows.append((path, label, source_document(name)))
+    return pd.DataFrame(rows, columns=SPLIT_COLUMNS[:3])
+
+
+def assign_splits(
+    images: pd.DataFrame, existing: pd.DataFrame, val_split=0.2, test_split=0.1
+) -> pd.DataFrame:
+    """
+    Assigns images to train, val and test splits. Images already in `existing` keep
+    their split, so the splits stay stable as labelled data grows. Every page of a
+    document goes to the same split, so no document is both trained and evaluated
+    on; new pages of a document already in the manifest join its split.
+
+    New documents are stratified by their rarest label, e.g. Include for a report
+    with 2 Include and 60 Exclude pages. Within each stratum, each document goes to
+    the split furthest below its share of that label's images so far, counted
+    across all documents, so even documents with a single positive page fill val
+    and test. Documents are visited in stable_hash order, so the assignment does
+    not depend on the order files are listed in.
+
+    :param images: A DataFrame with path, label and document columns, see scan_images.
+    :param existing: A previous split manifest, possibly empty.
+    :param val_split: The share of each label assigned to val.
+    :param test_split: The share of each label assigned to test.
+    :return: A split manifest with SPLIT_COLUMNS, for the images in `images`.
+    """
+    fractions = {
+        "train": 1 - val_split - test_split,
+        "val": val_split,
+        "test": test_split,
+    }
+    kept = existing[existing.path.isin(images.path)]
+    counts = kept.groupby(["label", "split"]).size().to_dict()
+    # documents already split, e.g. by an older manifest, keep their majority split
+    splits = kept.groupby("document").split.agg(lambda s: s.mode()[0]).to_dict()
+
+    new = images[~images.path.isin(kept.path)].copy()
+    for (label, split), count in (
+        new[new.document.isin(splits)]
+        .assign(split=lambda df: df.document.map(splits))
+        .groupby(["label", "split"])
+        .size()
+        .items()
+    ):
+        counts[(label, split)] = counts.get((label, split), 0) + count
+
+    label_totals = images.label.value_counts()
+    document_labels = images.groupby(["document", "label"]).size()
+    documents = [d for d in new.document.unique() if d not in splits]
+    for document in sorted(documents, key=stable_hash):
+        labels = document_labels.loc[document]
+        stratum = min(labels.index, key=lambda label: (label_totals[label], label))
+        size = labels[stratum]
+        total = sum(counts.get((stratum, s), 0) for s in SPLITS) + size
+        split = max(
+            SPLITS, key=lambda s: fractions[s] * total - counts.get((stratum, s), 0)
+        )
+        splits[document] = split
+        for label, count in labels.items():
+            counts[(label, split)] = counts.get((label, split), 0) + count
+    new["split"] = new.document.map(splits)
+
+    return pd.concat([kept, new[SPLIT_COLUMNS]], ignore_index=True).sort_values(
+        "path", ignore_index=True
+    )
+
+
+def read_split_manifest(path: str) -> pd.DataFrame:
+    """Reads a split manifest written by update_split_manifest."""
+    return pd.read_csv(path, dtype=str)
+
+
+def update_split_manifest(
+    data_root: str, manifest_path: str, val_split=0.2, test_split=0.1
+) -> pd.DataFrame:
+    """
+    Scans the labelled images and writes the split manifest, adding new images to
+    the splits and dropping deleted ones. Images already in the manifest keep
+    their split.
+
+    :param data_root: The ImageFolder root, with one folder per class.
+    :param manifest_path: The CSV file holding the split manifest.
+    :param val_split: The share of new images assigned to val.
+    :param test_split: The share of new images assigned to test.
+    :return: The split manifest.
+    """
+    if os.path.exists(manifest_path):
+        existing = read_split_manifest(manifest_path)
+    else:
+        existing = pd.DataFrame(columns=SPLIT_COLUMNS)
+    manifest = assign_splits(scan_images(data_root), existing, val_split, test_split)
+    tmp_path = f"{manifest_path}.tmp"
+    manifest.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, manifest_path)
+    return manifest
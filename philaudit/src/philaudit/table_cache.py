@@ -0,0 +1,171 @@
+import json
+import sqlite3
+import time
+import zlib
+
+import camelot
+import pandas as pd
+from camelot.core import Table
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_CHUNK = 500
+
+# Everything that changes camelot's output for a page. Bump it when the
+# read_pdf arguments in table_extractor change, so old entries are not used.
+CAMELOT_SETTINGS = {"flavor": "lattice", "camelot": camelot.__version__}
+
+
+def settings_id(settings: dict = CAMELOT_SETTINGS) -> str:
+    """Identifies the camelot settings a page was parsed with."""
+    return json.dumps(settings, sort_keys=True)
+
+
+def pack_tables(tables) -> bytes:
+    """Compress a page's camelot tables to just their cell text."""
+    return zlib.compress(
+        json.dumps([table.df.values.tolist() for table in tables]).encode()
+    )
+
+
+def unpack_tables(data: bytes, page: int) -> list:
+    """
+    Rebuild a page's tables from pack_tables. They have the df, shape, page and
+    order of the camelot tables they were packed from, but no cells or plot data.
+
+    :param data: The packed tables.
+    :param page: The page the tables were parsed from.
+    :return: A list of camelot Tables in page order.
+    """
+    tables = []
+    for order, rows in enumerate(json.loads(zlib.decompress(data)), start=1):
+        table = Table([], [])
+        table.df = pd.DataFrame(rows)
+        table.shape = table.df.shape
+        table.flavor = CAMELOT_SETTINGS["flavor"]
+        table.page = page
+        table.order = order
+        tables.append(table)
+    return tables
+
+
+class TableCache:
+    """
+    An on-disk SQLite cache of camelot's output per PDF page, keyed by the PDF's
+    content hash, the page number and the camelot settings. It stores each page's
+    tables as compressed cell text and whether camelot found the page
+    image-based. Changing a document's pages, or how its tables are cleaned, then
+    only parses pages camelot has not seen before.
+
+    The connection is opened lazily, so a cache can be handed to worker processes,
+    which each open their own. WAL mode lets those processes read while another
+    writes. Delete the file to clear it.
+    Example:
+    ```
+    cache = TableCache("path/to/PhilAuditStorage/table_cache.sqlite")
+    extractor = Extractor(pdf_path, pages, cache=cache)
+    ```
+    """
+
+    def __init__(self, path: str, settings: dict = CAMELOT_SETTINGS):
+        self.path = path
+        self.settings_id = settings_id(settings)
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=60)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "pdf_hash TEXT NOT NULL, "
+                "page INTEGER NOT NULL, "
+                "settings TEXT NOT NULL, "
+                "image_based INTEGER NOT NULL, "
+                "tables BLOB NOT NULL, "
+                "created REAL NOT NULL, "
+                "PRIMARY KEY (pdf_hash, page, settings))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get_many(self, pdf_hash: str, pages) -> dict:
+        """
+        Look up the cached output for pages of a PDF.
+
+        :param pdf_hash: The content hash of the PDF, see file_hash.
+        :param pages: A list of page numbers.
+        :return: A dictionary mapping each cached page to (tables, image_based).
+        """
+        found = {}
+        for i in range(0, len(pages), _QUERY_CHUNK):
+            chunk = pages[i : i + _QUERY_CHUNK]
+            rows = self.conn.execute(
+                "SELECT page, tables, image_based FROM pages "
+                "WHERE pdf_hash = ? AND settings = ? "
+                f"AND page IN ({','.join('?' * len(chunk))})",
+                [pdf_hash, self.settings_id, *chunk],
+            )
+            for page, data, image_based in rows:
+                found[page] = (unpack_tables(data, page), bool(image_based))
+
+        hits = sum(page in found for page in pages)
+        self.hits += hits
+        self.misses += len(pages) - hits
+        return found
+
+    def put_many(self, pdf_hash: str, pages: dict):
+        """
+        Store camelot's output for pages of a PDF.
+
+        :param pdf_hash: The content hash of the PDF, see file_hash.
+        :param pages: A dictionary mapping page numbers to (tables, image_based).
+            Pages without tables are stored too, with an empty list.
+        """
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    pdf_hash,
+                    page,
+                    self.settings_id,
+                    int(image_based),
+                    pack_tables(tables),
+                    now,
+                )
+                for page, (tables, image_based) in pages.items()
+            ],
+        )
+        self.conn.commit()
+
+    def iter_tables(self, limit=None):
+        """
+        Yield the cached tables' cell text, e.g. to benchmark table cleaning on
+        real camelot output.
+
+        :param limit: The number of pages to read tables from, or None for all.
+        :return: An iterator of DataFrames.
+        """
+        rows = self.conn.execute(
+            "SELECT page, tables FROM pages WHERE settings = ? LIMIT ?",
+            (self.settings_id, -1 if limit is None else limit),
+        )
+        for page, data in rows:
+            for table in unpack_tables(data, page):
+                yield table.df
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,146 @@
+import os
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# every row of a document's table carries these, from the year's metadata
+TABLE_METADATA = ["identifier", "year", "region", "province", "pages"]
+# stored in the directory names, e.g. Tables/year=2020/region=NCR
+PARTITIONS = ["year", "region"]
+PARTITIONING = ds.partitioning(
+    pa.schema([(name, pa.string()) for name in PARTITIONS]), flavor="hive"
+)
+
+
+def table_path(root: str, row) -> str:
+    """
+    The Parquet file holding a document's table in the dataset.
+
+    :param root: The dataset's root directory.
+    :param row: A row of the metadata DataFrame.
+    :return: root/year=.../region=.../<identifier>.parquet
+    """
+    # hive partition values are URI-encoded, so regions may contain any character
+    partition = [f"{name}={quote(str(row[name]), safe='')}" for name in PARTITIONS]
+    return os.path.join(root, *partition, f"{row.identifier}.parquet")
+
+
+def unique_columns(columns) -> list:
+    """
+    Makes column names unique the way pandas.read_excel does, "notes", "notes.1",
+    so a document's table can be written to Parquet. Metadata columns come first
+    and keep their names.
+    """
+    seen = set(TABLE_METADATA)
+    names = []
+    for column in map(str, columns):
+        name, i = column, 0
+        while name in seen:
+            i += 1
+            name = f"{column}.{i}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def document_frame(doctable: pd.DataFrame, row) -> pd.DataFrame:
+    """
+    Prepends a document's metadata to each row of its table.
+
+    :param doctable: A DocumentTable's doctable.
+    :param row: The document's row of the metadata DataFrame.
+    :return: A DataFrame with TABLE_METADATA and the table's columns, all strings.
+    """
+    cells = doctable.set_axis(unique_columns(doctable.columns), axis=1)
+    metadata = pd.DataFrame(
+        {name: [str(row[name])] * len(cells) for name in TABLE_METADATA},
+        index=cells.index,
+    )
+    frame = pd.concat([metadata, cells], axis=1)
+    return frame.astype(object).where(frame.notna(), None).reset_index(drop=True)
+
+
+def write_document_table(doctable: pd.DataFrame, row, root: str) -> str:
+    """
+    Adds a document's table to the dataset, replacing it if the document was
+    extracted before. Each document is its own file, so documents extracted in
+    parallel never write to the same file, and a half-written file is never read.
+
+    :param doctable: A DocumentTable's doctable.
+    :param row: The document's row of the metadata DataFrame.
+    :param root: The dataset's root directory.
+    :return: The path of the document's file.
+    """
+    frame = document_frame(doctable, row).drop(columns=PARTITIONS)
+    schema = pa.schema([(str(name), pa.string()) for name in frame.columns])
+    table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+    path = table_path(root, row)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # datasets skip files starting with "." while this one is written
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _filter(year=None, region=None):
+    expression = None
+    for name, value in (("year", year), ("region", region)):
+        if value is not None:
+            term = ds.field(name) == str(value)
+            expression = term if expression is None else expression & term
+    return expression
+
+
+def read_tables(root: str, year=None, region=None, columns=None) -> pd.DataFrame:
+    """
+    Reads the extracted tables back as one DataFrame. Documents have different
+    columns; the result has all of them, with missing cells as None.
+
+    :param root: The dataset's root directory.
+    :param year: Only read this year, or None for all.
+    :param region: Only read this region, or None for all.
+    :param columns: The columns to read, or None for all.
+    :return: A DataFrame with TABLE_METADATA first, then every table column.
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    expression = _filter(year, region)
+    names = {}  # ordered set
+    for fragment in dataset.get_fragments(filter=expression):
+        names.update(dict.fromkeys(fragment.physical_schema.names))
+    names = TABLE_METADATA + [name for name in names if name not in TABLE_METADATA]
+    schema = pa.schema([(name, pa.string()) for name in names])
+
+    dataset = ds.dataset(
+        root, format="parquet", partitioning=PARTITIONING, schema=schema
+    )
+    table = dataset.to_table(filter=expression, columns=columns)
+    return table.to_pandas()
+
+
+def export_excel(root: str, out: str, year=None, region=None) -> list:
+    """
+    Writes each document's table in the dataset to <identifier>.xlsx, as
+    extract.py did before the dataset existed.
+
+    :param root: The dataset's root directory.
+    :param out: The directory to write the workbooks to.
+    :param year: Only export this year, or None for all.
+    :param region: Only export this region, or None for all.
+    :return: The paths of the workbooks written.
+    """
+    dataset = ds.dataset(root, format="parquet", partitioning=PARTITIONING)
+    os.makedirs(out, exist_ok=True)
+    paths = []
+    for fragment in dataset.get_fragments(filter=_filter(year, region)):
+        # read each file on its own, to keep its columns and their order
+        frame = pq.read_table(fragment.path).to_pandas()
+        identifier = os.path.basename(fragment.path)[: -len(".parquet")]
+        path = os.path.join(out, f"{identifier}.xlsx")
+        frame.drop(columns=TABLE_METADATA, errors="ignore").to_excel(path, index=False)
+        paths.append(path)
+    return paths
@@ -1,56 +1,253 @@
 import logging
+import math
+import re
 import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 import camelot
+from camelot.core import TableList
+
+from philaudit.page_content import IMAGE_BASED, NO_LATTICE, classify_document
+from philaudit.pages import format_page_string, parse_page_string
+from philaudit.prediction_cache import file_hash
 
 logging.getLogger("camelot").setLevel(logging.WARNING)
 
+# documents with fewer pages per worker than this are parsed in one process
+MIN_CHUNK_PAGES = 4
+# pages parsed per camelot call when streaming; each call reopens the PDF,
+# while each chunk's tables are held until they are yielded
+STREAM_CHUNK_PAGES = 8
+# camelot parses each page as a temporary page-N.pdf and warns about it by name
+IMAGE_BASED_RE = re.compile(r"page-(\d+) is image-based")
+
+
+def read_lattice(pdf_path: str, pages: str, keep_images: bool = True) -> tuple:
+    """
+    Parse the given pages of a PDF with camelot's lattice flavor.
+
+    :param pdf_path: Path to the PDF file
+    :param pages: Pages to read, in camelot's page string format
+    :param keep_images: Whether tables keep the rendered page camelot.plot uses.
+        It is ~25MB per table, too large to send between processes.
+    :return: The TableList and the pages camelot warned are image-based. Page 0
+        stands for a warning that did not name its page.
+    """
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        table_list = camelot.read_pdf(pdf_path, pages=pages, flavor="lattice")
+    if not keep_images:
+        for table in table_list:
+            table._image = None
+    image_pages = set()
+    for warning in w:
+        message = str(warning.message)
+        if issubclass(warning.category, UserWarning) and "image-based" in message:
+            match = IMAGE_BASED_RE.search(message)
+            image_pages.add(int(match.group(1)) if match else 0)
+    return table_list, image_pages
+
+
+def page_chunks(pages: str, workers: int) -> list:
+    """
+    Split a page string into at most `workers` page strings of consecutive target
+    pages, each at least MIN_CHUNK_PAGES long.
+
+    :param pages: Pages to read, e.g. "3-10, 14"
+    :param workers: The number of processes available
+    :return: A list of page strings in page order
+    """
+    try:
+        page_list = parse_page_string(pages)
+    except ValueError:  # e.g. "all" or "end", left to camelot
+        return [pages]
+    num_chunks = max(1, min(workers, len(page_list) // MIN_CHUNK_PAGES))
+    size = math.ceil(len(page_list) / num_chunks)
+    return [
+        format_page_string(page_list[i : i + size])
+        for i in range(0, len(page_list), size)
+    ]
+
 
 class TableExtractor:
-    def __init__(self, pdf_path: str, pages: str):
+    """
+    Parses the target pages of a PDF with camelot, lazily: nothing is parsed until
+    the tables or flags are asked for. iter_tables streams the tables page by
+    page without holding the whole TableList, and can be abandoned part way.
+    is_image_based and no_lattice parse every page first, unless the stream has
+    ended or precheck has already classified the document from its content
+    stream. table_list holds every table, and parses the pages again if they
+    were only streamed.
+    Example:
+    ```
+    extractor = TableExtractor(pdf_path, pages)
+    for table in extractor.iter_tables():
+        ...
+    extractor.no_lattice  # known once the stream has ended
+    ```
+    """
+
+    def __init__(self, pdf_path: str, pages: str, workers: int = 1, cache=None):
         self.path = pdf_path
         self.pages = pages
-        self.is_image_based = False
-        self.no_lattice = False
-        self.table_list = None
+        self.workers = workers
+        self.cache = cache
+        self._table_list = None
+        self._image_pages = set()
+        self._num_tables = 0
+        self._done = False  # every page has been parsed, or parsing failed
+        self._failed = False
+        self._classified = None  # NO_LATTICE or IMAGE_BASED, from precheck
         # Configure logging
         self.logger = logging.getLogger(__name__)
         logging.basicConfig(level=logging.INFO)
-        self._setup_table_list(pdf_path, pages)
 
-    def _setup_table_list(self, pdf_path: str, pages: str) -> None:
+    @property
+    def table_list(self):
         """
-        Set up the table list by reading the PDF with the given path and pages.
-
-        :param pdf_path: Path to the PDF file
-        :param pages: Pages to read
+        All of the tables, or None if the PDF could not be read. After the tables
+        have been streamed, e.g. by Extractor, they are read again, from the
+        TableCache if there is one.
         """
-        with warnings.catch_warnings(record=True) as w:
-            warnings.simplefilter("always")
+        if self._table_list is None and not self._failed:
             try:
-                self.table_list = camelot.read_pdf(
-                    pdf_path, pages=pages, flavor="lattice"
+                self._table_list = TableList(list(self.iter_tables()))
+            except Exception:  # logged by iter_tables
+                return None
+        return self._table_list
+
+    @property
+    def is_image_based(self) -> bool:
+        if self._classified is not None:
+            return self._classified == IMAGE_BASED
+        if not self._done:
+            self.table_list
+        return not self._failed and bool(self._image_pages)
+
+    @property
+    def no_lattice(self) -> bool:
+        if self._classified is not None:
+            return self._classified == NO_LATTICE
+        if not self._done:
+            self.table_list
+        return not self._failed and self._num_tables == 0
+
+    def precheck(self) -> bool:
+        """
+        Classify the document from its target pages' content streams, without
+        camelot. A document with no page that could hold a lattice table, or with
+        a page that is only a scan, is flagged in milliseconds.
+
+        :return: Whether the document was flagged.
+        """
+        self._classified = classify_document(self.path, self.pages)
+        if self._classified == NO_LATTICE:
+            self.logger.info(f" {self.path} has no lattice tables. Flagging.")
+        elif self._classified == IMAGE_BASED:
+            self.logger.info(f" {self.path} has image-based target pages. Flagging.")
+        return self._classified is not None
+
+    def iter_tables(self):
+        """
+        Yield the tables in page order, parsing pages as they are needed, up to
+        STREAM_CHUNK_PAGES at a time. With more than one worker, the chunks are
+        parsed in separate processes, one chunk ahead per process. With a
+        TableCache, only the pages it does not have are parsed. The flags are
+        set once the stream has ended.
+
+        A page camelot fails on ends the stream with its error, so a document is
+        never mistaken for one with only the tables read before it.
+
+        :return: An iterator of camelot Tables.
+        """
+        if self._table_list is not None:
+            yield from self._table_list
+            return
+        self._image_pages = set()
+        self._num_tables = 0
+        self._failed = False
+        try:
+            for tables, image_pages in self._iter_pages():
+                self._image_pages |= image_pages
+                self._num_tables += len(tables)
+                yield from tables
+        except Exception as e:
+            self._failed = True
+            self._done = True
+            self.logger.error(f" {e} while reading {self.path}.")
+            raise
+        self._done = True
+
+        if self._num_tables == 0:
+            self.logger.info(f" {self.path} has no lattice tables. Flagging.")
+        elif self._image_pages:
+            self.logger.info(f" {self.path} has image-based target pages. Flagging.")
+
+    def _iter_pages(self):
+        # (tables, image pages) for each target page in order
+        try:
+            page_list = parse_page_string(self.pages)
+        except ValueError:  # e.g. "all", read in one go
+            yield read_lattice(self.path, self.pages)
+            return
+        cached = {}
+        if self.cache is not None:
+            pdf_hash = file_hash(self.path)
+            cached = self.cache.get_many(pdf_hash, page_list)
+
+        missing = [page for page in page_list if page not in cached]
+        parsed = self._parse(missing)
+        for page in page_list:
+            if page not in cached:
+                # chunks are parsed in page order, so the next one holds this page
+                while page not in cached:
+                    chunk = next(parsed)
+                    if self.cache is not None:
+                        self.cache.put_many(pdf_hash, chunk)
+                    cached.update(chunk)
+            tables, image_based = cached.pop(page)
+            yield tables, {page} if image_based else set()
+
+    def _parse(self, pages: list):
+        # {page: (tables, image_based)} for each chunk of the pages in order
+        if not pages:
+            return
+        num_workers = len(page_chunks(format_page_string(pages), self.workers))
+        size = min(STREAM_CHUNK_PAGES, math.ceil(len(pages) / num_workers))
+        chunks = [pages[i : i + size] for i in range(0, len(pages), size)]
+        if num_workers <= 1:
+            for chunk in chunks:
+                yield self._by_page(
+                    chunk, *read_lattice(self.path, format_page_string(chunk))
                 )
-            except Exception as e:
-                self.table_list = None
-                self.logger.error(f" {e} during PDFExtractor construction.")
-                return
-
-            if len(self.table_list) == 0:
-                self.no_lattice = True
-                self.logger.info(f" {pdf_path} has no lattice tables. Flagging.")
-                return
-
-            # Check if there is a UserWarning that matches the image-based warning
-            for warning in w:
-                if issubclass(warning.category, UserWarning) and "image-based" in str(
-                    warning.message
-                ):
-                    self.is_image_based = True
-                    self.logger.info(
-                        f" {pdf_path} has image-based target pages. Flagging."
-                    )
-                    return
+            return
+        pool = ProcessPoolExecutor(max_workers=num_workers)
+
+        def submit(chunk):
+            string = format_page_string(chunk)
+            return chunk, pool.submit(read_lattice, self.path, string, False)
+
+        try:
+            # one chunk in flight per process, so an abandoned stream only waits
+            # for those, and the chunks after them are never parsed
+            pending = deque(map(submit, chunks[:num_workers]))
+            queued = deque(chunks[num_workers:])
+            while pending:
+                chunk, future = pending.popleft()
+                result = future.result()
+                if queued:
+                    pending.append(submit(queued.popleft()))
+                yield self._by_page(chunk, *result)
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    @staticmethod
+    def _by_page(pages: list, table_list, image_pages: set) -> dict:
+        parsed = {page: ([], page in image_pages or 0 in image_pages) for page in pages}
+        for table in table_list:
+            parsed[table.page][0].append(table)
+        return parsed
 
     def read_pdf(self) -> list:
         """
@@ -0,0 +1,158 @@
+import io
+import re
+
+import pandas as pd
+from pdfminer.converter import TextConverter
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+from .pages import format_page_string, parse_page_string
+from .predictions import parse_image_name
+
+# Phrases of the "Status of Implementation of Prior Years' Audit Recommendations"
+# section, matched with whitespace and punctuation removed. The status values
+# mark the table's continuation pages, which carry no heading. Each phrase
+# counts up to `max_count` times per page.
+KEYWORDS = {
+    "statusofimplementation": (3.0, 1),
+    "prioryearsauditrecommendations": (2.0, 1),
+    "auditrecommendations": (1.0, 1),
+    "notimplemented": (1.0, 3),
+    "partiallyimplemented": (1.0, 3),
+    "fullyimplemented": (1.0, 3),
+    "implemented": (0.5, 4),
+}
+DEFAULT_MIN_SCORE = 2.0
+DEFAULT_MARGIN = 1
+# a page with fewer extracted characters than this has no usable text layer
+DEFAULT_MIN_CHARS = 50
+
+CANDIDATE_COLUMNS = [
+    "identifier",
+    "path",
+    "page_count",
+    "text_pages",
+    "image_only",
+    "full_path",
+    "max_score",
+    "candidates",
+]
+
+
+def page_texts(pdf_path: str):
+    """
+    Extracts the raw text of each page with pdfminer. Layout analysis is skipped,
+    so characters come out in content stream order, which is all that keyword
+    matching needs and much cheaper than camelot's or extract_text's layout pass.
+
+    :param pdf_path: The path to the PDF.
+    :return: A generator of each page's text, in page order.
+    """
+    resource_manager = PDFResourceManager(caching=True)
+    with open(pdf_path, "rb") as f:
+        for page in PDFPage.get_pages(f):
+            output = io.StringIO()
+            device = TextConverter(resource_manager, output, laparams=None)
+            PDFPageInterpreter(resource_manager, device).process_page(page)
+            device.close()
+            yield output.getvalue()
+
+
+def normalize_text(text: str) -> str:
+    """Lower-cases text and drops everything but letters and digits, so phrases
+    match however the PDF spaced or hyphenated them."""
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def score_text(text: str) -> float:
+    """Scores a page's text by the KEYWORDS it contains."""
+    text = normalize_text(text)
+    return sum(
+        weight * min(text.count(keyword), max_count)
+        for keyword, (weight, max_count) in KEYWORDS.items()
+    )
+
+
+def candidate_pages(scores, min_score=DEFAULT_MIN_SCORE, margin=DEFAULT_MARGIN):
+    """
+    Selects the pages scoring at least `min_score`, with `margin` pages either side
+    so that table pages with little text around a hit are not lost.
+
+    :param scores: Each page's score, in page order.
+    :param min_score: The score a page needs to be a candidate.
+    :param margin: The number of neighbouring pages added on each side of a hit.
+    :return: A sorted list of 1-indexed candidate pages.
+    """
+    pages = set()
+    for page, score in enumerate(scores, start=1):
+        if score >= min_score:
+            pages.update(range(page - margin, page + margin + 1))
+    return sorted(page for page in pages if 1 <= page <= len(scores))
+
+
+def scan_pdf(
+    pdf_path: str,
+    identifier: str,
+    min_score: float = DEFAULT_MIN_SCORE,
+    margin: int = DEFAULT_MARGIN,
+    min_chars: int = DEFAULT_MIN_CHARS,
+) -> dict:
+    """
+    Scores every page of a PDF by its text layer. A document is flagged for the
+    full path, i.e. rendering and classifying every page, when it is image-only
+    (less than half its pages have text) or when no page scores a hit. Otherwise
+    pages without text, e.g. scans bound into a digital report, cannot be scored
+    and are always candidates.
+
+    :param pdf_path: The path to the PDF.
+    :param identifier: The document's identifier from the metadata.
+    :param min_score: The score a page needs to be a candidate.
+    :param margin: The number of neighbouring pages added on each side of a hit.
+    :param min_chars: The characters a page needs to count as having text.
+    :return: A dictionary with CANDIDATE_COLUMNS.
+    """
+    scores = []
+    textless = []
+    for page, text in enumerate(page_texts(pdf_path), start=1):
+        if len(text.strip()) < min_chars:
+            textless.append(page)
+        scores.append(score_text(text))
+
+    page_count = len(scores)
+    text_pages = page_count - len(textless)
+    image_only = text_pages < page_count / 2
+    hits = [] if image_only else candidate_pages(scores, min_score, margin)
+    candidates = sorted(set(hits).union(textless)) if hits else []
+    return {
+        "identifier": identifier,
+        "path": pdf_path,
+        "page_count": page_count,
+        "text_pages": text_pages,
+        "image_only": image_only,
+        "full_path": image_only or not hits,
+        "max_score": max(scores, default=0.0),
+        "candidates": format_page_string(candidates),
+    }
+
+
+def load_candidates(path: str) -> dict:
+    """
+    Reads the candidates CSV written by scripts/text_prefilter.py.
+
+    :param path: PhilAuditStorage/Metadata/20XX_candidates.csv
+    :return: A dictionary mapping each identifier to its list of candidate pages,
+        or to None for documents flagged for the full path.
+    """
+    df = pd.read_csv(path, keep_default_na=False)
+    return {
+        row.identifier: None if row.full_path else parse_page_string(row.candidates)
+        for row in df.itertuples()
+    }
+
+
+def is_candidate(candidates: dict, image: str) -> bool:
+    """Whether a page image is a candidate. Pages of documents that were not
+    scanned, or that are flagged for the full path, always are."""
+    identifier, page = parse_image_name(image)
+    pages = candidates.get(identifier)
+    return pages is None or page in pages
@@ -1,13 +1,19 @@
 import re
 
+import pandas as pd
+
 
 class TextNormalizer:
-    def __init__(self):
+    def __init__(self, max_memo_entries: int = 100_000):
         # Regex patterns for text normalization
         self.linebreak_re = re.compile(r"([a-zA-Z0-9])(\n)([a-zA-Z0-9])")
         self.camelcase_re = re.compile(r"([a-z])([A-Z])([a-z])")
         self.punctuation_re = re.compile(r"([:,;.])(?!\s)")
         self.spaces_re = re.compile(r"\s+")
+        # normalized text of cells seen before, oldest first; cells such as
+        # "" and "not implemented" repeat throughout a document
+        self.max_memo_entries = max_memo_entries
+        self._memo = {}
 
     def normalize(self, text: str) -> str:
         """
@@ -28,3 +34,50 @@ class TextNormalizer:
         text = self.spaces_re.sub(" ", text)  # ensure single spaces
         text = text.replace("\n", " ")  # remove all linebreaks
         return text.lower().strip()
+
+    def normalize_series(self, series: pd.Series) -> pd.Series:
+        """
+        Normalize every cell of a Series, with the same output as mapping normalize
+        over it. Each distinct string is normalized once, by whole-column string
+        operations, and remembered for later calls.
+
+        :param series: Cells to normalize
+        :return: The normalized cells, with the Series' index and name
+        """
+        values = series.to_numpy(dtype=object)
+        new = list({v for v in values if isinstance(v, str) and v not in self._memo})
+        if new:
+            self._memo.update(zip(new, self._normalize_strings(new)))
+        memo = self._memo
+        cells = [memo[v] if isinstance(v, str) else self.normalize(v) for v in values]
+        self._evict()
+        return pd.Series(cells, index=series.index, name=series.name)
+
+    def normalize_frame(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """
+        Normalize every cell of a DataFrame, with the same output as
+        frame.map(normalize). See normalize_series.
+
+        :param frame: Cells to normalize
+        :return: The normalized cells, with the DataFrame's index and columns
+        """
+        if frame.empty:
+            return frame.map(self.normalize)
+        return pd.DataFrame(
+            {i: self.normalize_series(frame.iloc[:, i]) for i in range(frame.shape[1])}
+        ).set_axis(frame.columns, axis=1)
+
+    def _normalize_strings(self, texts: list) -> list:
+        # object dtype keeps the str methods on Python's re, as normalize uses
+        texts = pd.Series(texts, dtype=object)
+        texts = texts.str.replace(self.linebreak_re, r"\1 \3", regex=True)
+        texts = texts.str.replace(self.camelcase_re, r"\1 \2\3", regex=True)
+        texts = texts.str.replace(self.punctuation_re, r"\1 ", regex=True)
+        texts = texts.str.replace(self.spaces_re, " ", regex=True)
+        texts = texts.str.replace("\n", " ", regex=False)
+        return texts.str.lower().str.strip().tolist()
+
+    def _evict(self):
+        # forget the oldest entries past the limit
+        for _ in range(len(self._memo) - self.max_memo_entries):
+            del self._memo[next(iter(self._memo))]
@@ -1,17 +1,110 @@
+import argparse
+import itertools
+import multiprocessing
+import os
 from typing import List, Union
 
 import optuna
+import pandas as pd
 import pytorch_lightning as pl
+import torch
+from optuna.study import MaxTrialsCallback
+from optuna.trial import TrialState
 from pytorch_lightning.loggers import TensorBoardLogger
 
-from .callbacks import get_callbacks
+from .benchmark import measure, torch_runner
+from .callbacks import (
+    ChannelsLast,
+    OptunaPruningCallback,
+    SamplesPerSecond,
+    get_callbacks,
+)
 from .datamodule import PhilDataModule
 from .model import PhilTableDetection
-from .transforms import DEFAULT_TRANSFORMS
+from .transforms import DEFAULT_TRANSFORMS, IMAGE_SIZE, get_transforms
 
 # Use the following line during tensor core GPU training
 # torch.set_float32_matmul_precision("medium")
 
+PRUNERS = ("median", "hyperband", "none")
+# "bf16-mixed" autocasts on CPUs and GPUs, "16-mixed" only on GPUs
+PRECISIONS = ("32", "bf16-mixed", "16-mixed")
+# the multi-objective search maximizes recall and precision, minimizes latency
+OBJECTIVES = ("val_recall", "val_prec", "ms_per_image")
+DIRECTIONS = ("maximize", "maximize", "minimize")
+# input resolutions searched, as fractions of IMAGE_SIZE
+RESOLUTION_SCALES = (0.5, 0.75, 1.0)
+
+
+def suggest_hyperparameters(trial) -> dict:
+    """The default search space over PhilTableDetection's constructor args.
+    fc1 sees the whole flattened feature map, so its size grows with
+    num_filters2 * num_fc_nodes; both are capped at the defaults to keep
+    every trial's model no larger than the default one.
+
+    Args:
+        trial (optuna.Trial): The current trial to be evaluated.
+    Returns:
+        dict: Keyword arguments for PhilTableDetection.
+    """
+    return {
+        "learning_rate": trial.suggest_float("learning_rate", 1e-5, 1e-2, log=True),
+        "weight_decay": trial.suggest_float("weight_decay", 1e-6, 1e-2, log=True),
+        "dropout_rate": trial.suggest_float("dropout_rate", 0.0, 0.5),
+        "num_filters1": trial.suggest_categorical("num_filters1", [8, 16, 32]),
+        "num_filters2": trial.suggest_categorical("num_filters2", [16, 32]),
+        "filter_size": trial.suggest_categorical("filter_size", [3, 5]),
+        "num_fc_nodes": trial.suggest_categorical("num_fc_nodes", [32, 64]),
+    }
+
+
+def suggest_image_size(trial) -> tuple:
+    """Samples the model's input resolution, keeping IMAGE_SIZE's aspect ratio.
+
+    Args:
+        trial (optuna.Trial): The current trial to be evaluated.
+    Returns:
+        tuple: The (height, width) images are resized to.
+    """
+    scale = trial.suggest_categorical("resolution_scale", RESOLUTION_SCALES)
+    return tuple(round(scale * side) for side in IMAGE_SIZE)
+
+
+def check_precision(precision: str, accelerator: str):
+    """Rejects a precision the accelerator cannot train with. Lightning raises a
+    MisconfigurationException for each trial instead, which a search does not
+    catch, so the study would stop at its first trial.
+
+    Args:
+        precision (str): One of PRECISIONS.
+        accelerator (str): The Lightning accelerator, e.g. "cpu" or "auto".
+    Raises:
+        ValueError: For 16-mixed precision on a CPU.
+    """
+    on_cpu = accelerator == "cpu" or (
+        accelerator == "auto" and not torch.cuda.is_available()
+    )
+    if precision == "16-mixed" and on_cpu:
+        raise ValueError(
+            "16-mixed precision needs a GPU. Train with bf16-mixed or 32 on a CPU."
+        )
+
+
+def get_pruner(name: str, max_epochs: int) -> optuna.pruners.BasePruner:
+    """Builds the pruner that stops unpromising trials after an epoch or two.
+
+    Args:
+        name (str): One of PRUNERS.
+        max_epochs (int): The number of epochs a trial trains for at most.
+    Returns:
+        optuna.pruners.BasePruner: The pruner.
+    """
+    if name == "median":
+        return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=1)
+    if name == "hyperband":
+        return optuna.pruners.HyperbandPruner(min_resource=1, max_resource=max_epochs)
+    return optuna.pruners.NopPruner()
+
 
 def objective(
     trial,
@@ -26,64 +119,436 @@ def objective(
     log_dir: Union[str, None] = None,
     callbacks: Union[List, None] = None,
     transforms: List = DEFAULT_TRANSFORMS,
+    cache_dir: Union[str, None] = None,
+    split_manifest: Union[str, None] = None,
+    precision: str = "32",
+    channels_last: bool = False,
+    multi_objective: bool = False,
+    latency_images: int = 64,
+    latency_batch_size: int = 32,
 ):
     """The objective function to be optimized by Optuna.
-    Review this code for specifics on the default search space.
+    Hyperparameters are sampled from the trial with suggest_hyperparameters,
+    and the trial's val_loss is reported after every epoch so the study's
+    pruner can stop it early.
 
     You will probably need to adjust the num_workers and batch_size
     for the dataloader used here, as well as the number of trials to run.
 
     It is possible to start the model from a past training checkpoint,
     though in my experience, this method is particularly prone to overfitting.
+    The checkpoint's hyperparameters are used and none are sampled.
+
+    Pass the cache_dir of a dataset cache built with build_dataset_cache to
+    read preprocessed images instead of decoding every PNG in every epoch.
+    Pass a split_manifest written by update_split_manifest to train and
+    validate on the same images as every other trial and past study.
 
+    precision (one of PRECISIONS) and channels_last select a faster training
+    mode; the measured train_samples_per_sec is logged every epoch.
+
+    With multi_objective, the input resolution is searched too and the trial
+    is not pruned. The trained model's CPU inference latency is measured on
+    latency_images validation images, in batches of latency_batch_size as
+    when sorting, and the trial's OBJECTIVES are returned.
 
     Args:
         trial (optuna.Trial): The current trial to be evaluated.
     Returns:
-        float: The validation loss of the model.
+        float: The validation loss of the model, or with multi_objective a
+            tuple of its validation recall, precision and ms per image.
     """
+    if model_ckpt:
+        model = PhilTableDetection.load_from_checkpoint(model_ckpt)
+    else:
+        hyperparameters = suggest_hyperparameters(trial)
+        if multi_objective:
+            hyperparameters["image_size"] = suggest_image_size(trial)
+        model = PhilTableDetection(**hyperparameters)
+    if tuple(model.image_size) != IMAGE_SIZE:
+        transforms = get_transforms(tuple(model.image_size))
 
     datamodule = PhilDataModule(
         data_root=data_root,
         num_workers=num_workers,
         batch_size=batch_size,
         transforms=transforms,
+        cache_dir=cache_dir,
+        split_manifest=split_manifest,
     )
 
-    if model_ckpt:
-        model = PhilTableDetection().load_from_checkpoint(model_ckpt)
-    else:
-        model = PhilTableDetection()
-
     if not experiment_name:
         experiment_name = f"{model.__class__.__name__}"
+    trial_ckpt_dir = None
+    if ckpt_dir:
+        trial_ckpt_dir = os.path.join(ckpt_dir, f"trial_{trial.number}")
     if not callbacks:
-        callbacks = get_callbacks(checkpoint_dir=ckpt_dir)
+        callbacks = get_callbacks(checkpoint_dir=trial_ckpt_dir)
+    callbacks = [*callbacks, SamplesPerSecond()]
+    if not multi_objective:
+        # Optuna cannot prune trials of multi-objective studies
+        callbacks.append(OptunaPruningCallback(trial, monitor="val_loss"))
+    if channels_last:
+        callbacks.append(ChannelsLast())
 
-    logger = TensorBoardLogger(save_dir=log_dir, name=experiment_name)
+    logger = TensorBoardLogger(
+        save_dir=log_dir, name=experiment_name, version=f"trial_{trial.number}"
+    )
 
     # Train the model
     trainer = pl.Trainer(
         max_epochs=max_epochs,  # Adjust this to your needs
         accelerator=accelerator,
+        precision=precision,
         logger=logger,
         enable_model_summary=True,
         enable_progress_bar=True,
         callbacks=callbacks,
     )
     trainer.fit(model, datamodule=datamodule)
-    return trainer.logged_metrics["val_loss"]
+    if not multi_objective:
+        return float(trainer.logged_metrics["val_loss"])
 
+    # the objectives are measured on the final weights, which the val_loss
+    # checkpoints may not include, so save them alongside
+    checkpoint = os.path.join(trial_ckpt_dir or logger.log_dir, "final.ckpt")
+    trainer.save_checkpoint(checkpoint)
+    trial.set_user_attr("image_size", list(model.image_size))
+    trial.set_user_attr("checkpoint", checkpoint)
+    images = torch.cat(
+        [
+            inputs
+            for inputs, _ in itertools.islice(
+                datamodule.val_dataloader(),
+                -(-latency_images // datamodule.batch_size),
+            )
+        ]
+    )[:latency_images]
+    run = torch_runner(model.cpu(), channels_last=channels_last)
+    latency = measure(run, images, latency_batch_size)
+    metrics = {**trainer.callback_metrics, "ms_per_image": latency["ms_per_image"]}
+    return tuple(float(metrics[name]) for name in OBJECTIVES)
 
-if __name__ == "__main__":
-    # TODO: Add argparse for these
-    data_root = "./training_data/"
-    checkpointdir = "./checkpoints/"
-    log_dir = "./tb_logs/"
-    checkpoint = None
-    n_trials = 5
 
-    my_objective = objective()
+def compare_training_modes(
+    data_root: str,
+    modes=(("32", False), ("32", True), ("bf16-mixed", False), ("bf16-mixed", True)),
+    max_steps: int = 50,
+    batch_size: int = 16,
+    num_workers: int = 2,
+    accelerator: str = "cpu",
+    cache_dir: Union[str, None] = None,
+    split_manifest: Union[str, None] = None,
+) -> List[dict]:
+    """Measures training throughput of the default model in each training mode.
+
+    Args:
+        data_root (str): The ImageFolder root of the training data.
+        modes (list): (precision, channels_last) pairs to measure.
+        max_steps (int): The number of training batches run per mode.
+        batch_size (int): The number of samples per batch.
+        num_workers (int): The number of DataLoader processes.
+        accelerator (str): The Lightning accelerator to train on.
+        cache_dir (str, optional): A dataset cache built with build_dataset_cache.
+        split_manifest (str, optional): A split manifest, see update_split_manifest.
+    Returns:
+        list: One dictionary per mode with its measured samples per second.
+    """
+    results = []
+    for precision, channels_last in modes:
+        throughput = SamplesPerSecond()
+        callbacks = [throughput, ChannelsLast()] if channels_last else [throughput]
+        trainer = pl.Trainer(
+            max_steps=max_steps,
+            accelerator=accelerator,
+            precision=precision,
+            logger=False,
+            enable_checkpointing=False,
+            enable_model_summary=False,
+            limit_val_batches=0,
+            callbacks=callbacks,
+        )
+        datamodule = PhilDataModule(
+            data_root=data_root,
+            num_workers=num_workers,
+            batch_size=batch_size,
+            transforms=DEFAULT_TRANSFORMS,
+            cache_dir=cache_dir,
+            split_manifest=split_manifest,
+        )
+        try:
+            trainer.fit(PhilTableDetection(), datamodule=datamodule)
+            result = {"samples_per_second": throughput.samples_per_second}
+        except Exception as e:  # e.g. 16-mixed without a GPU
+            result = {"error": str(e)}
+        results.append(
+            {"precision": precision, "channels_last": channels_last, **result}
+        )
+    return results
+
+
+def load_study(
+    study_name: str,
+    storage_path: str,
+    pruner: str,
+    max_epochs: int,
+    multi_objective: bool = False,
+):
+    """Creates a study in a local SQLite file, or loads it to resume it.
+
+    Workers send a heartbeat while they run a trial. A trial whose worker died,
+    e.g. because the search was interrupted, is marked failed once its heartbeat
+    goes stale and is retried once by whichever worker notices.
+
+    Args:
+        study_name (str): The name of the study within the storage.
+        storage_path (str): Path of the SQLite file, shared by all workers.
+        pruner (str): One of PRUNERS.
+        max_epochs (int): The number of epochs a trial trains for at most.
+        multi_objective (bool): Whether the study optimizes OBJECTIVES rather
+            than minimizing val_loss. Its trials are never pruned.
+    Returns:
+        optuna.Study: The study.
+    """
+    storage = optuna.storages.RDBStorage(
+        url=f"sqlite:///{os.path.abspath(storage_path)}",
+        engine_kwargs={"connect_args": {"timeout": 60}},
+        heartbeat_interval=60,
+        grace_period=180,
+        failed_trial_callback=optuna.storages.RetryFailedTrialCallback(max_retry=1),
+    )
+    return optuna.create_study(
+        study_name=study_name,
+        storage=storage,
+        directions=DIRECTIONS if multi_objective else ["minimize"],
+        pruner=get_pruner("none" if multi_objective else pruner, max_epochs),
+        load_if_exists=True,
+    )
+
+
+def _search_worker(
+    study_name: str,
+    storage_path: str,
+    pruner: str,
+    n_trials: int,
+    num_threads: int,
+    objective_kwargs: dict,
+):
+    torch.set_num_threads(num_threads)
+    study = load_study(
+        study_name,
+        storage_path,
+        pruner,
+        objective_kwargs.get("max_epochs", 5),
+        objective_kwargs.get("multi_objective", False),
+    )
+    # counts finished trials across every worker and every earlier run
+    max_trials = MaxTrialsCallback(
+        n_trials, states=(TrialState.COMPLETE, TrialState.PRUNED)
+    )
+    study.optimize(
+        lambda trial: objective(trial, **objective_kwargs),
+        callbacks=[max_trials],
+        catch=(RuntimeError,),
+    )
+
+
+def run_search(
+    study_name: str,
+    storage_path: str,
+    n_trials: int,
+    workers: int = 1,
+    pruner: str = "median",
+    **objective_kwargs,
+) -> optuna.Study:
+    """Runs a hyperparameter search until the study has n_trials finished trials,
+    across several worker processes sharing one study. Running it again with the
+    same storage resumes the study rather than starting over.
 
-    study = optuna.create_study(direction="minimize")
-    study.optimize(objective, n_trials=n_trials)
+    Args:
+        study_name (str): The name of the study within the storage.
+        storage_path (str): Path of the SQLite file holding the study.
+        n_trials (int): The number of completed or pruned trials to reach.
+        workers (int): The number of processes running trials at once.
+        pruner (str): One of PRUNERS.
+        **objective_kwargs: Keyword arguments passed through to objective.
+            With multi_objective, run one worker so that the latency of each
+            trial is not measured while other trials are training.
+    Returns:
+        optuna.Study: The study.
+    Raises:
+        ValueError: For a precision the accelerator cannot train with.
+    """
+    check_precision(
+        objective_kwargs.get("precision", "32"),
+        objective_kwargs.get("accelerator", "cpu"),
+    )
+    args = (study_name, storage_path, pruner, n_trials)
+    max_epochs = objective_kwargs.get("max_epochs", 5)
+    multi_objective = objective_kwargs.get("multi_objective", False)
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    # create the study once before the workers race to
+    load_study(study_name, storage_path, pruner, max_epochs, multi_objective)
+    if workers == 1:
+        _search_worker(*args, num_threads, objective_kwargs)
+    else:
+        context = multiprocessing.get_context("spawn")
+        processes = [
+            context.Process(
+                target=_search_worker, args=(*args, num_threads, objective_kwargs)
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+            if process.exitcode != 0:
+                # e.g. killed for running out of memory; its trial is retried later
+                print(f"Search worker exited with code {process.exitcode}.")
+    return load_study(study_name, storage_path, pruner, max_epochs, multi_objective)
+
+
+def pareto_front(study: optuna.Study) -> pd.DataFrame:
+    """The trials of a multi-objective study that no other trial beats on every
+    objective, from the fastest to the slowest.
+
+    Args:
+        study (optuna.Study): A study searched with multi_objective.
+    Returns:
+        pd.DataFrame: One row per trial with its OBJECTIVES, image_size,
+            checkpoint and hyperparameters.
+    """
+    front = pd.DataFrame(
+        [
+            {
+                "trial": trial.number,
+                **dict(zip(OBJECTIVES, trial.values)),
+                **trial.user_attrs,
+                **trial.params,
+            }
+            for trial in study.best_trials
+        ]
+    )
+    return front.sort_values("ms_per_image", ignore_index=True) if len(front) else front
+
+
+def cheapest_model(front: pd.DataFrame, min_recall: float) -> Union[pd.Series, None]:
+    """Picks the fastest model on a Pareto front that meets a recall floor.
+
+    Args:
+        front (pd.DataFrame): A Pareto front from pareto_front.
+        min_recall (float): The lowest acceptable val_recall.
+    Returns:
+        pd.Series: The front's row for the model, or None if none meets the floor.
+    """
+    eligible = front[front.val_recall >= min_recall] if len(front) else front
+    if not len(eligible):
+        return None
+    return eligible.sort_values(
+        ["ms_per_image", "val_prec"], ascending=[True, False]
+    ).iloc[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Search PhilTableDetection's hyperparameters with Optuna."
+    )
+    parser.add_argument("--data-root", default="./training_data/")
+    parser.add_argument("--cache-dir", default=None, help="See build_dataset_cache")
+    parser.add_argument(
+        "--split-manifest", default=None, help="See update_split_manifest"
+    )
+    parser.add_argument("--checkpoint-dir", default="./checkpoints/")
+    parser.add_argument("--log-dir", default="./tb_logs/")
+    parser.add_argument("--checkpoint", default=None, help="Start from a checkpoint")
+    parser.add_argument("--study-name", default="PhilTableDetection")
+    parser.add_argument(
+        "--storage", default="./optuna.sqlite", help="SQLite file holding the study"
+    )
+    parser.add_argument("--n-trials", type=int, default=20)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Processes running trials at once"
+    )
+    parser.add_argument("--pruner", choices=PRUNERS, default="median")
+    parser.add_argument("--max-epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--num-workers", type=int, default=2)
+    parser.add_argument("--accelerator", default="cpu")
+    parser.add_argument("--precision", choices=PRECISIONS, default="32")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument(
+        "--compare-modes",
+        action="store_true",
+        help="Measure samples/sec of each precision and memory format, then exit",
+    )
+    parser.add_argument(
+        "--multi-objective",
+        action="store_true",
+        help="Search resolution too, trading recall and precision against CPU latency",
+    )
+    parser.add_argument(
+        "--min-recall",
+        type=float,
+        default=0.95,
+        help="Recall floor for the recommended model of a multi-objective search",
+    )
+    parser.add_argument(
+        "--pareto-output", default=None, help="CSV file to write the Pareto front to"
+    )
+    args = parser.parse_args()
+
+    if args.compare_modes:
+        for result in compare_training_modes(
+            args.data_root,
+            batch_size=args.batch_size,
+            num_workers=args.num_workers,
+            accelerator=args.accelerator,
+            cache_dir=args.cache_dir,
+            split_manifest=args.split_manifest,
+        ):
+            print(result)
+        return
+
+    study = run_search(
+        args.study_name,
+        args.storage,
+        args.n_trials,
+        workers=args.workers,
+        pruner=args.pruner,
+        data_root=args.data_root,
+        num_workers=args.num_workers,
+        batch_size=args.batch_size,
+        model_ckpt=args.checkpoint,
+        ckpt_dir=args.checkpoint_dir,
+        experiment_name=args.study_name,
+        max_epochs=args.max_epochs,
+        accelerator=args.accelerator,
+        log_dir=args.log_dir,
+        cache_dir=args.cache_dir,
+        split_manifest=args.split_manifest,
+        precision=args.precision,
+        channels_last=args.channels_last,
+        multi_objective=args.multi_objective,
+    )
+    if not args.multi_objective:
+        print(f"Best trial {study.best_trial.number}: val_loss {study.best_value:.4f}")
+        print(study.best_params)
+        return
+
+    front = pareto_front(study)
+    print(front.to_string())
+    if args.pareto_output:
+        front.to_csv(args.pareto_output, index=False)
+    model = cheapest_model(front, args.min_recall)
+    if model is None:
+        print(f"No model on the Pareto front reaches a recall of {args.min_recall}.")
+    else:
+        print(
+            f"Fastest model with recall >= {args.min_recall}: trial {model.trial}, "
+            f"{model.ms_per_image:.2f} ms per image. {model.checkpoint or ''}"
+        )
+
+
+if __name__ == "__main__":
+    main()
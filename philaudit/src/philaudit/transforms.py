@@ -18,11 +18,20 @@ class EnsureLandscape(album.ImageOnlyTransform):
 
 # preserve aspect ratio from original image size (1700, 2200)
 # but resize to a smaller size for faster training
-DEFAULT_TRANSFORMS = album.Compose(
-    transforms=[
-        album.Resize(442, 572, always_apply=True),
-        EnsureLandscape(always_apply=True),
-        album.Normalize(),
-        ToTensorV2(),
-    ]
-)
+IMAGE_SIZE = (442, 572)
+
+
+def get_transforms(image_size=IMAGE_SIZE):
+    """The inference and training transforms for a model taking images of
+    image_size, e.g. a smaller one found by a multi-objective search."""
+    return album.Compose(
+        transforms=[
+            album.Resize(*image_size, always_apply=True),
+            EnsureLandscape(always_apply=True),
+            album.Normalize(),
+            ToTensorV2(),
+        ]
+    )
+
+
+DEFAULT_TRANSFORMS = get_transforms()
@@ -0,0 +1,123 @@
+"""
+Golden tests for DocumentTable. The expected tables were produced by the
+original cell-by-cell implementation, so the vectorized cleaning must match it:
+header rows repeated on every page are dropped, overflow rows are appended to
+the row above, a long first row is not taken as the header, and every cell is
+normalized. Unlike the original, which dropped all but the first row of an
+overflow run, a whole run is appended.
+"""
+
+import pandas as pd
+import pytest
+
+from philaudit.document_table import ADDITIONAL_COLUMNS, DocumentTable
+from philaudit.text_normalizer import TextNormalizer
+
+HEADER = ["Audit Observation", "Recommendation", "Status of\nImplementation"]
+LONG_OBSERVATION = "1. " + "The agency did not reconcile its records " * 3
+
+
+class FakeTable:
+    """Stands in for a camelot Table, of which DocumentTable only reads df."""
+
+    def __init__(self, rows):
+        self.df = pd.DataFrame(rows)
+
+
+CASES = {
+    "repeated_headers_and_overflow": (
+        [
+            [
+                HEADER,
+                [
+                    "1. CashAdvances were\nnot liquidated",
+                    "Require the\nofficers to liquidate",
+                    "Not Implemented",
+                ],
+                ["within the period,as required", "immediately", ""],
+                [
+                    "2. Payroll was notSupported",
+                    "Submit the\nsupporting documents",
+                    "Partially Implemented",
+                ],
+            ],
+            [
+                HEADER,
+                ["in accordance with;COA rules", "", ""],
+                ["and other laws", "and regulations", ""],
+                ["3) Fixed assets", "Conduct a count", "Implemented"],
+            ],
+        ],
+        ["audit observation", "recommendation", "status of implementation"],
+        [
+            [
+                "1. cash advances were not liquidated within the period, as required",
+                "require the officers to liquidate immediately",
+                "not implemented",
+            ],
+            [
+                "2. payroll was not supported in accordance with; coa rules "
+                "and other laws",
+                "submit the supporting documents and regulations",
+                "partially implemented",
+            ],
+            ["3) fixed assets", "conduct a count", "implemented"],
+        ],
+    ),
+    "long_header": (
+        [
+            [
+                [LONG_OBSERVATION, "Reconcile", "Implemented"],
+                ["which resulted in an overstatement", "", ""],
+                ["2. Unliquidated advances", "Liquidate", "Not Implemented"],
+            ],
+        ],
+        ["0", "1", "2"],
+        [
+            [
+                "1. the agency did not reconcile its records the agency did not "
+                "reconcile its records the agency did not reconcile its records "
+                "which resulted in an overstatement",
+                "reconcile",
+                "implemented",
+            ],
+            ["2. unliquidated advances", "liquidate", "not implemented"],
+        ],
+    ),
+    "no_numbered_rows": (
+        [
+            [
+                ["Observation", "Recommendation"],
+                ["Cash was short", "Investigate"],
+                ["Assets were missing", "Count them"],
+            ],
+        ],
+        ["observation", "recommendation"],
+        [["cash was short", "investigate"], ["assets were missing", "count them"]],
+    ),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_doctable_matches_golden_output(name):
+    pages, columns, rows = CASES[name]
+    tables = [FakeTable(page) for page in pages]
+    doctable = DocumentTable(tables, TextNormalizer()).doctable
+
+    expected = pd.DataFrame(rows, columns=columns)
+    for column in ADDITIONAL_COLUMNS:
+        expected[column] = ""
+    assert list(doctable.columns) == list(expected.columns)
+    assert doctable.astype(object).values.tolist() == expected.values.tolist()
+
+
+def test_doctable_reads_a_stream_of_tables():
+    pages, _, _ = CASES["repeated_headers_and_overflow"]
+    from_list = DocumentTable([FakeTable(page) for page in pages], TextNormalizer())
+    from_stream = DocumentTable((FakeTable(page) for page in pages), TextNormalizer())
+    assert from_stream.doctable.equals(from_list.doctable)
+
+
+def test_doctable_of_no_tables_is_none():
+    assert DocumentTable(iter([]), TextNormalizer()).doctable is None
+    assert DocumentTable(None, TextNormalizer()).doctable is None
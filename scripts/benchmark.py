@@ -0,0 +1,83 @@
+import argparse
+import json
+import os
+
+import pandas as pd
+
+from philaudit.benchmark import (
+    COMPILE_MODES,
+    GRAD_MODES,
+    available_backends,
+    benchmark_matrix,
+    environment,
+    load_images,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark detector inference across a matrix of settings."
+    )
+    parser.add_argument("weights", help="Path to the model weights checkpoint")
+    parser.add_argument("image_folder", help="Folder of page images to run on")
+    parser.add_argument(
+        "--output", default="benchmark.json", help="Path of the JSON report"
+    )
+    parser.add_argument(
+        "--max-images", type=int, default=128, help="Number of images to run on"
+    )
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument(
+        "--threads",
+        type=int,
+        nargs="+",
+        default=None,
+        help="torch.set_num_threads values (default: 1, half and all cores)",
+    )
+    parser.add_argument(
+        "--backends", nargs="+", choices=available_backends(), default=None
+    )
+    parser.add_argument(
+        "--compile-modes", nargs="+", choices=COMPILE_MODES, default=COMPILE_MODES
+    )
+    parser.add_argument(
+        "--grad-modes", nargs="+", choices=GRAD_MODES, default=GRAD_MODES
+    )
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.image_folder, image)
+        for image in os.listdir(args.image_folder)
+        if image.endswith(".png")
+    )[: args.max_images]
+    images = load_images(paths, args.weights)
+
+    results = []
+    for result in benchmark_matrix(
+        args.weights,
+        images,
+        batch_sizes=args.batch_sizes,
+        thread_counts=args.threads,
+        backends=args.backends,
+        compile_modes=args.compile_modes,
+        grad_modes=args.grad_modes,
+    ):
+        print(result)
+        results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {"environment": environment(args.weights), "results": results},
+            f,
+            indent=2,
+        )
+
+    df = pd.DataFrame(results)
+    if "images_per_second" in df:
+        df = df.sort_values("images_per_second", ascending=False)
+        print(df.head(10).to_string(index=False))
+    print(f"Done! Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
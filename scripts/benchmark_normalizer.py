@@ -0,0 +1,87 @@
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from philaudit.table_cache import TableCache
+from philaudit.text_normalizer import TextNormalizer
+
+
+def time_call(fn, repeat):
+    """The best of `repeat` runs of fn, in seconds, and its last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_normalizer(frames, repeat=3) -> dict:
+    """
+    Times TextNormalizer on camelot tables, per cell through DataFrame.map as
+    DocumentTable used to, and in batches through normalize_frame with a cold and
+    a warm memo. The outputs are checked to be identical.
+
+    :param frames: A list of DataFrames of raw camelot cell text.
+    :param repeat: The number of runs; the fastest is reported.
+    :return: A dictionary of cell counts and timings.
+    """
+    normalizer = TextNormalizer()
+    cells = sum(frame.size for frame in frames)
+    unique = len(pd.unique(pd.concat([f.stack() for f in frames]).to_numpy(object)))
+
+    per_cell, expected = time_call(
+        lambda: [frame.map(normalizer.normalize) for frame in frames], repeat
+    )
+
+    def cold():
+        normalizer._memo.clear()
+        return [normalizer.normalize_frame(frame) for frame in frames]
+
+    batch_cold, result = time_call(cold, repeat)
+    batch_warm, _ = time_call(
+        lambda: [normalizer.normalize_frame(frame) for frame in frames], repeat
+    )
+    return {
+        "tables": len(frames),
+        "cells": cells,
+        "unique_cells": unique,
+        "map_seconds": per_cell,
+        "batch_cold_seconds": batch_cold,
+        "batch_warm_seconds": batch_warm,
+        "cold_speedup": per_cell / batch_cold if batch_cold else None,
+        "warm_speedup": per_cell / batch_warm if batch_warm else None,
+        "identical": all(a.equals(b) for a, b in zip(expected, result)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark TextNormalizer on the camelot tables in a table cache."
+    )
+    parser.add_argument("cache", help="A table cache written by extract.py")
+    parser.add_argument(
+        "--max-pages", type=int, default=None, help="Pages to read tables from"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per timing")
+    parser.add_argument("--output", default=None, help="Path of a JSON report")
+    args = parser.parse_args()
+
+    frames = list(TableCache(args.cache).iter_tables(args.max_pages))
+    if not frames:
+        print(f"No tables in {args.cache}, run extract.py --table-cache first.")
+        return
+
+    result = benchmark_normalizer(frames, args.repeat)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Done! Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import argparse
+
+from philaudit.datamodule import build_dataset_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Decode and resize the labelled training images once into a "
+        "memory-mapped dataset cache."
+    )
+    parser.add_argument("data_root", help="Training data folder, one folder per class")
+    parser.add_argument("cache_dir", help="Directory to write the cache to")
+    parser.add_argument(
+        "--num-workers", type=int, default=2, help="DataLoader decoding processes"
+    )
+    args = parser.parse_args()
+
+    count = build_dataset_cache(args.data_root, args.cache_dir, args.num_workers)
+    print(f"Done! Cached {count} images in {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
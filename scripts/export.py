@@ -0,0 +1,46 @@
+import argparse
+import os
+
+from philaudit.detector import BACKENDS, Detector
+from philaudit.export import compare_backends, export_all
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export a checkpoint to ONNX and an int8-quantized ONNX model."
+    )
+    parser.add_argument("weights", help="Path to the model weights checkpoint")
+    parser.add_argument(
+        "--validate",
+        default=None,
+        help="Folder of images to check the exported models' predictions against",
+    )
+    args = parser.parse_args()
+
+    paths = export_all(args.weights)
+    for backend, path in paths.items():
+        print(f"Exported {backend} model to {path}")
+
+    if args.validate:
+        images = sorted(
+            os.path.join(args.validate, image)
+            for image in os.listdir(args.validate)
+            if image.endswith(".png")
+        )
+        reference = Detector(args.weights, backend="torch")
+        for backend in BACKENDS[1:]:
+            report = compare_backends(
+                reference, Detector(args.weights, backend), images
+            )
+            print(
+                f"{backend}: {report['images']} images, "
+                f"max |diff| {report['max_abs_diff']:.5f}, "
+                f"mean |diff| {report['mean_abs_diff']:.5f}, "
+                f"{report['flipped']} predictions flipped "
+                f"({report['agreement']:.2%} agreement)"
+            )
+    print("Done!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import argparse
+
+from philaudit.table_dataset import export_excel
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Write each document's table in the extracted Parquet dataset "
+        "to an Excel workbook."
+    )
+    parser.add_argument(
+        "dataset", help="e.g. path/to/philauditstorage/Extracted/Tables"
+    )
+    parser.add_argument("out", help="Directory to write <identifier>.xlsx files to")
+    parser.add_argument("--year", default=None, help="Only export this year")
+    parser.add_argument("--region", default=None, help="Only export this region")
+    args = parser.parse_args()
+
+    paths = export_excel(args.dataset, args.out, args.year, args.region)
+    print(f"Done! {len(paths)} workbooks written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
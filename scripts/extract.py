@@ -1,12 +1,18 @@
+import argparse
+import multiprocessing
 import os
 import shutil
-import sys
+import signal
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pandas as pd
 from tqdm import tqdm
 
 from philaudit.extractor import Extractor
+from philaudit.table_cache import TableCache
+from philaudit.table_dataset import table_path, write_document_table
+from philaudit.text_normalizer import TextNormalizer
 
 
 def handle_existing_file(md_acc, path):
@@ -22,7 +28,7 @@ def handle_pageless(md_acc, row, pageless_dir):
         if handle_existing_file(md_acc, pageless_path):
             return True
 
-        md_acc.append((True, None))
+        md_acc.append((True, None, None))
         shutil.copy(row.path, pageless_dir)
         return True
     return False
@@ -48,38 +54,243 @@ def handle_errors(md_acc, row, extractor, no_lattice_dir, image_pdfs_dir):
     return False
 
 
-def extract_data(df, out):
-    pageless_dir = os.path.join(out, "Errors", "Pageless")
-    no_lattice_dir = os.path.join(out, "Errors", "No_lattice")
-    image_pdfs_dir = os.path.join(out, "Errors", "Image_pdfs")
-    complete_dir = os.path.join(out, "Complete")
+def output_dirs(out, dataset=None):
+    """
+    The output locations of a year's extraction.
 
-    # initialize metadata accumulator to later append to df
-    md_acc = []  # (error, error_msg, extracted_path)
-    for _, row in tqdm(
-        df.iterrows(),
-        desc="Extracting data",
-    ):
-        complete_path = os.path.join(complete_dir, f"{row.identifier[:-4]}.xlsx")
-        if handle_existing_file(md_acc, complete_path):
-            continue
+    :param out: The year's Extracted directory.
+    :param dataset: The root of a Parquet dataset to write tables to, or None to
+        write an Excel workbook per document to Complete.
+    """
+    return {
+        "pageless": os.path.join(out, "Errors", "Pageless"),
+        "no_lattice": os.path.join(out, "Errors", "No_lattice"),
+        "image_pdfs": os.path.join(out, "Errors", "Image_pdfs"),
+        "complete": os.path.join(out, "Complete"),
+        "dataset": dataset,
+    }
 
-        if handle_pageless(md_acc, row, pageless_dir):
-            continue
 
-        extractor = Extractor(row.path, row.pages)
+def complete_path(row, dirs):
+    if dirs["dataset"]:
+        return table_path(dirs["dataset"], row)
+    return os.path.join(dirs["complete"], f"{row.identifier[:-4]}.xlsx")
 
-        if handle_errors(md_acc, row, extractor, no_lattice_dir, image_pdfs_dir):
-            continue
 
+def precheck_document(row, dirs):
+    """
+    Handles the documents that need no parsing: already extracted or pageless.
+
+    :param row: A row of the metadata DataFrame.
+    :param dirs: The output directories, see output_dirs.
+    :return: The document's (error, error_msg, extracted_path), or None if it
+        needs to be extracted.
+    """
+    md_acc = []
+    if handle_existing_file(md_acc, complete_path(row, dirs)):
+        return md_acc[0]
+    if handle_pageless(md_acc, row, dirs["pageless"]):
+        return md_acc[0]
+    return None
+
+
+def extract_document(
+    row, dirs, page_workers=1, cache=None, text_normalizer=None, precheck=True
+):
+    """
+    Parses a document's target pages with camelot and writes its cleaned table
+    to Complete or the dataset, or copies it to one of the Errors folders.
+
+    :param row: A row of the metadata DataFrame.
+    :param dirs: The output directories, see output_dirs.
+    :param page_workers: The number of processes parsing the document's pages.
+    :param cache: An optional TableCache of camelot's output per page.
+    :param text_normalizer: A TextNormalizer shared with other documents, so
+        cells seen in earlier documents are not normalized again.
+    :param precheck: Whether to flag documents from their content streams before
+        camelot runs. Turn it off to have camelot parse a misclassified document.
+    :return: The document's (error, error_msg, extracted_path).
+    """
+    md_acc = []
+    path = complete_path(row, dirs)
+    extractor = Extractor(row.path, row.pages, page_workers, cache, text_normalizer)
+    doctable, error = None, None
+    # most image-based and table-less documents are flagged before camelot runs
+    if not (precheck and extractor.table_extractor.precheck()):
         try:
-            extractor.doctable.to_excel(complete_path, index=False)
-        except Exception as e:
-            md_acc.append((True, e, None))
-            print(f"Error with {row.document}, skipping. Lost {row.pg_count} pages.")
-            continue
+            # streams the pages into the table, which sets the extractor's flags
+            doctable = extractor.doctable
+        except Exception as e:  # reported below, unless the document is flagged
+            error = e
+
+    if handle_errors(md_acc, row, extractor, dirs["no_lattice"], dirs["image_pdfs"]):
+        return md_acc[0]
+
+    try:
+        if error is not None:
+            raise error
+        if dirs["dataset"]:
+            write_document_table(doctable, row, dirs["dataset"])
+        else:
+            doctable.to_excel(path, index=False)
+    except Exception as e:
+        print(f"Error with {row.document}, skipping. Lost {row.pg_count} pages.")
+        return (True, str(e), None)
+
+    return (False, None, path)
+
+
+def _limited_worker(conn, memory_limit, row, dirs, page_workers, cache, precheck):
+    if hasattr(os, "setpgrp"):
+        # lead a process group, so that a timeout also kills the page workers
+        os.setpgrp()
+    if memory_limit:
+        import resource
+
+        limit = int(memory_limit * 1024**3)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        conn.send(extract_document(row, dirs, page_workers, cache, precheck=precheck))
+    except BaseException as e:  # e.g. MemoryError past the limit
+        conn.send((True, repr(e), None))
+    finally:
+        conn.close()
+
+
+def _worker_context():
+    # forkserver children fork from a process that has already imported
+    # camelot, so each document starts quickly without forking our threads
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["__main__", "philaudit.extractor"])
+        return context
+    return multiprocessing.get_context("spawn")
 
-        md_acc.append((False, None, complete_path))
+
+def _kill(process):
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:  # the whole group has already exited
+            pass
+    elif process.is_alive():
+        process.kill()
+
+
+def extract_document_limited(
+    row,
+    dirs,
+    timeout=None,
+    memory_limit=None,
+    context=None,
+    page_workers=1,
+    cache=None,
+    precheck=True,
+):
+    """
+    Runs extract_document in a child process that is killed if it runs longer
+    than `timeout`, and cannot allocate more than `memory_limit` of address
+    space. A pathological PDF is recorded as an error instead of stalling
+    or crashing the whole run. Page workers inherit the limits and are killed
+    with the child.
+
+    :param row: A row of the metadata DataFrame.
+    :param dirs: The output directories, see output_dirs.
+    :param timeout: Seconds the document may take, or None for no limit.
+    :param memory_limit: GB of address space each process may use, or None for no limit.
+    :param context: The multiprocessing context to start the child from.
+    :param page_workers: The number of processes parsing the document's pages.
+    :param cache: An optional TableCache of camelot's output per page.
+    :param precheck: Whether to flag documents before camelot runs, see extract_document.
+    :return: The document's (error, error_msg, extracted_path).
+    """
+    context = context or _worker_context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_limited_worker,
+        args=(sender, memory_limit, row, dirs, page_workers, cache, precheck),
+    )
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            print(f"{row.document} timed out after {timeout}s, skipping.")
+            return (True, f"Timed out after {timeout}s", None)
+        return receiver.recv()
+    except EOFError:  # the child died without sending a result
+        process.join()
+        print(f"{row.document} crashed its worker, skipping.")
+        return (True, f"Worker exited with code {process.exitcode}", None)
+    finally:
+        _kill(process)
+        process.join()
+        receiver.close()
+
+
+def extract_data(
+    df,
+    out,
+    workers=1,
+    timeout=None,
+    memory_limit=None,
+    page_workers=1,
+    cache=None,
+    dataset=None,
+    precheck=True,
+):
+    """
+    Extracts every document in a metadata DataFrame. With more than one worker, or
+    with a timeout or memory limit, each document is parsed in its own child
+    process and `workers` documents are parsed at once. The results are
+    collected in metadata order either way.
+
+    :param df: The year's metadata DataFrame.
+    :param out: The year's Extracted directory.
+    :param workers: The number of documents parsed at once.
+    :param timeout: Seconds a document may take, or None for no limit.
+    :param memory_limit: GB of address space a document may use, or None for no limit.
+    :param page_workers: The number of processes parsing each document's pages, so
+        that a long document does not hold up the end of the run.
+    :param cache: An optional TableCache. Pages camelot has already parsed are read
+        from it, so re-running after changing the pages or the table cleaning only
+        parses new pages.
+    :param dataset: The root of a Parquet dataset, partitioned by year and region,
+        to add each document's table to instead of writing it to Excel.
+    :param precheck: Whether to flag documents from their content streams before
+        camelot runs, see extract_document.
+    :return: The metadata with error, error_msg and extracted_path columns.
+    """
+    dirs = output_dirs(out, dataset)
+    limited = workers > 1 or timeout or memory_limit
+    context = _worker_context() if limited else None
+    # documents extracted in this process share the memo of normalized cells
+    text_normalizer = TextNormalizer()
+
+    def extract(row):
+        result = precheck_document(row, dirs)
+        if result is not None:
+            return result
+        if limited:
+            return extract_document_limited(
+                row,
+                dirs,
+                timeout,
+                memory_limit,
+                context,
+                page_workers,
+                cache,
+                precheck,
+            )
+        return extract_document(
+            row, dirs, page_workers, cache, text_normalizer, precheck
+        )
+
+    rows = [row for _, row in df.iterrows()]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map yields results in metadata order, whatever order they finish in
+        md_acc = list(  # (error, error_msg, extracted_path)
+            tqdm(pool.map(extract, rows), total=len(rows), desc="Extracting data")
+        )
 
     df["error"] = [d[0] for d in md_acc]
     df["error_msg"] = [d[1] for d in md_acc]
@@ -88,7 +299,60 @@ def extract_data(df, out):
 
 
 def main():
-    root = sys.argv[1]  # Should be a year directory from within PhilAuditStorage
+    parser = argparse.ArgumentParser(
+        description="Extract the target tables of a year's documents with camelot."
+    )
+    parser.add_argument("root", help="A year directory from within PhilAuditStorage")
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Documents parsed at once"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Seconds a document may take before it is skipped as an error",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=float,
+        default=None,
+        help="GB of memory a document may use before it is skipped as an error",
+    )
+    parser.add_argument(
+        "--page-workers",
+        type=int,
+        default=1,
+        help="Processes parsing the pages of each document",
+    )
+    parser.add_argument(
+        "--table-cache",
+        default=None,
+        help="SQLite file caching camelot's tables per page, e.g. "
+        "path/to/philauditstorage/table_cache.sqlite",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["excel", "parquet"],
+        default="excel",
+        help="Write each document's table to Complete/<identifier>.xlsx, or add "
+        "it to a Parquet dataset partitioned by year and region",
+    )
+    parser.add_argument(
+        "--dataset",
+        default=None,
+        help="Root of the Parquet dataset, defaults to "
+        "path/to/philauditstorage/Extracted/Tables",
+    )
+    parser.add_argument(
+        "--no-precheck",
+        dest="precheck",
+        action="store_false",
+        help="Parse every document with camelot, even those the content stream "
+        "pre-pass would flag",
+    )
+    args = parser.parse_args()
+
+    root = args.root
     year = Path(root).name  # PhilAuditStorage/Year --> Year
     metadata_path = Path(root).parent.absolute() / "Metadata"
     metadata_file = metadata_path / f"{year}_metadata.csv"
@@ -96,8 +360,22 @@ def main():
     df = pd.read_csv(metadata_file)
     out = os.path.join(root, "..", "Extracted", year)
 
+    cache = TableCache(args.table_cache) if args.table_cache else None
+    dataset = None
+    if args.output_format == "parquet":
+        dataset = args.dataset or os.path.join(root, "..", "Extracted", "Tables")
     # result of extract is an updated metadata file
-    md = extract_data(df, out)
+    md = extract_data(
+        df,
+        out,
+        args.workers,
+        args.timeout,
+        args.memory_limit,
+        args.page_workers,
+        cache,
+        dataset,
+        args.precheck,
+    )
     print("Done! Data extracted.")
     md.to_excel(os.path.join(metadata_path, f"{year}_metadata.xlsx"))
     print("Metadata has been updated with errors and extracted paths.")
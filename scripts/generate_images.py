@@ -1,43 +1,562 @@
+import argparse
+import json
 import os
-import sys
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import pandas as pd
-from pdf2image import convert_from_path
+import psutil
+import torch
+from pdf2image import convert_from_path, pdfinfo_from_path
 from tqdm import tqdm
 
+from philaudit.detector import BACKENDS, Detector, checkpoint_id
+from philaudit.pages import contiguous_ranges, format_page_string, parse_page_string
+from philaudit.predictions import predictions_frame, write_predictions
+from philaudit.prefilter import RulingLinePrefilter
+from philaudit.text_layer import load_candidates
 
-def convert_pdf_to_images(pdf_path: str, identifier: str, output_folder: str):
+RENDER_PROFILES = {
+    # pdf2image renders at 200 dpi by default, i.e. a letter page is 1700x2200 RGB
+    "full": {"size": None, "page_bytes": 1700 * 2200 * 3},
+    # (width, height) of DEFAULT_TRANSFORMS' 442x572 resize, which becomes a no-op
+    "detector": {"size": (572, 442), "page_bytes": 572 * 442 * 3},
+}
+PAGE_BYTES = RENDER_PROFILES["full"]["page_bytes"]
+PDFTOPPM_PAGE_RE = re.compile(r"-(\d+)\.png$")
+DEFAULT_CHUNK_SIZE = 10
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_REVIEW_MARGIN = 0.1
+STATS_COLUMNS = [
+    "identifier",
+    "pages",
+    "rendered",
+    "seconds",
+    "pages_per_second",
+    "error",
+]
+
+
+def get_page_count(pdf_path: str) -> int:
+    """
+    Reads the page count of a PDF from its metadata without rendering any pages.
+
+    :param pdf_path: The path to the PDF file.
+    :return: The number of pages in the PDF.
+    """
+    return pdfinfo_from_path(pdf_path)["Pages"]
+
+
+def page_chunks(first_page: int, last_page: int, chunk_size: int):
+    """
+    Splits an inclusive, 1-indexed page range into consecutive chunks.
+
+    :param first_page: The first page of the range.
+    :param last_page: The last page of the range.
+    :param chunk_size: The maximum number of pages per chunk.
+    :return: A generator of (first_page, last_page) tuples.
+    """
+    for start in range(first_page, last_page + 1, chunk_size):
+        yield start, min(start + chunk_size - 1, last_page)
+
+
+def pdf_fingerprint(pdf_path: str) -> dict:
+    """
+    Identifies a version of a PDF by its size and modification time, read with a single stat call.
+
+    :param pdf_path: The path to the PDF file.
+    :return: A dictionary with the file's size in bytes and its mtime.
+    """
+    stat = os.stat(pdf_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_manifest(manifest_path: str) -> dict:
+    """
+    Loads a render manifest, which maps each PDF path to its fingerprint, page count, render
+    settings, and the string of pages already rendered for it.
+
+    :param manifest_path: The path to the manifest JSON file.
+    :return: The manifest, or an empty dictionary if it does not exist yet.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict, manifest_path: str):
+    """
+    Writes a render manifest atomically, so that a crash never leaves a truncated file.
+
+    :param manifest: The manifest to save.
+    :param manifest_path: The path to the manifest JSON file.
+    """
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, manifest_path)
+
+
+def current_manifest_entry(
+    manifest: dict, pdf_path: str, profile: str, grayscale: bool
+):
+    """
+    Looks up a PDF's manifest entry, discarding it if the PDF or the render settings have changed.
+
+    :param manifest: The render manifest.
+    :param pdf_path: The path to the PDF file.
+    :param profile: The render profile of the current run.
+    :param grayscale: The grayscale setting of the current run.
+    :return: The manifest entry, or None if there is no entry that is still valid.
+    """
+    entry = manifest.get(str(pdf_path))
+    if entry is None:
+        return None
+    fingerprint = pdf_fingerprint(pdf_path)
+    if (
+        entry["size"] != fingerprint["size"]
+        or entry["mtime"] != fingerprint["mtime"]
+        or entry["profile"] != profile
+        or entry["grayscale"] != grayscale
+    ):
+        return None
+    return entry
+
+
+def convert_pdf_to_images(
+    pdf_path: str,
+    identifier: str,
+    output_folder: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    profile: str = "full",
+    grayscale: bool = False,
+    pages=None,
+    overwrite: bool = False,
+) -> dict:
     """
     Converts a PDF to PNG images, saving each page as a separate image in the specified output folder.
+    Pages are rendered `chunk_size` at a time, and pdftoppm writes each PNG itself, so pages are
+    never decoded into PIL images. Files are renamed into place from a temporary directory.
 
     :param pdf_path: The path to the PDF file to be converted.
     :param identifier: An identifier used to name the output image files.
     :param output_folder: PhilAuditStorage/Images/year/All
+    :param chunk_size: The number of pages rendered per call to pdftoppm.
+    :param profile: A key of RENDER_PROFILES, "full" or "detector" (the model's input size).
+    :param grayscale: Whether to render single-channel images.
+    :param pages: An optional list of 1-indexed pages to render. Defaults to every page.
+    :param overwrite: Whether to replace images already on disk, e.g. rendered from an
+        older version of the PDF or with other render settings.
+    :return: A dictionary of render statistics for the document.
     """
-    images = convert_from_path(pdf_path, fmt="png")
-    for idx, img in enumerate(images):
-        img_path = os.path.join(
-            output_folder,
-            f"{identifier}_page_{idx + 1}.png",  # +1 since camelot is 1-indexed
+    start = time.perf_counter()
+    page_count = get_page_count(pdf_path)
+    if pages is None:
+        pages = range(1, page_count + 1)
+    pages = [page for page in pages if 1 <= page <= page_count]
+    # pages left over from an interrupted run are already on disk
+    missing = [
+        page
+        for page in pages
+        if overwrite
+        or not os.path.exists(
+            os.path.join(output_folder, f"{identifier}_page_{page}.png")
         )
+    ]
+    size = RENDER_PROFILES[profile]["size"]
+    rendered = 0
+    with tempfile.TemporaryDirectory(dir=output_folder) as tmp_folder:
+        for first, last in contiguous_ranges(missing):
+            for first_page, last_page in page_chunks(first, last, chunk_size):
+                tmp_paths = convert_from_path(
+                    pdf_path,
+                    fmt="png",
+                    first_page=first_page,
+                    last_page=last_page,
+                    size=size,
+                    grayscale=grayscale,
+                    output_folder=tmp_folder,
+                    output_file="page",
+                    paths_only=True,
+                )
+                for tmp_path in tmp_paths:
+                    page = int(PDFTOPPM_PAGE_RE.search(tmp_path).group(1))
+                    img_path = os.path.join(
+                        output_folder,
+                        f"{identifier}_page_{page}.png",  # camelot is 1-indexed
+                    )
+
+                    if os.path.exists(img_path) and not overwrite:
+                        os.remove(tmp_path)
+                    else:
+                        os.replace(tmp_path, img_path)
+                        rendered += 1
+
+    seconds = time.perf_counter() - start
+    return {
+        "identifier": identifier,
+        "pages": len(pages),
+        "rendered": rendered,
+        "seconds": seconds,
+        "pages_per_second": len(pages) / seconds if seconds else 0.0,
+        "error": None,
+        "page_count": page_count,
+        "completed_pages": pages,
+    }
+
 
-        if not os.path.exists(img_path):
-            img.save(img_path, "png")
+# each streaming worker process loads its own Detector once, see _init_detector
+_detector = None
 
 
-def generate_page_images(df: pd.DataFrame, image_root: str):
+def _init_detector(model_weights: str, num_threads: int, backend: str, prefilter=None):
+    global _detector
+    torch.set_num_threads(num_threads)
+    _detector = Detector(model_weights, backend=backend, prefilter=prefilter)
+
+
+def classify_pdf_pages(
+    pdf_path: str,
+    identifier: str,
+    include_folder: str,
+    exclude_folder: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    threshold: float = DEFAULT_THRESHOLD,
+    review_margin: float = DEFAULT_REVIEW_MARGIN,
+    pages=None,
+    profile: str = "detector",
+    grayscale: bool = False,
+) -> dict:
+    """
+    Renders a PDF in page chunks and classifies each chunk in memory with the worker's Detector,
+    skipping the All folder entirely. Only pages that need manual review are written as PNGs:
+    predicted includes go to the include folder, and excludes whose probability falls within
+    `review_margin` of the threshold go to the exclude folder. Pages outside `pages` are
+    recorded with a probability of 0, as sort.py records pages that are not candidates.
+
+    :param pdf_path: The path to the PDF file to be classified.
+    :param identifier: An identifier used to name the output image files.
+    :param include_folder: PhilAuditStorage/Images/year/Include
+    :param exclude_folder: PhilAuditStorage/Images/year/Exclude
+    :param chunk_size: The number of pages rendered per call to pdftoppm.
+    :param threshold: The probability above which a page is included.
+    :param review_margin: The width of the band below the threshold that is kept for review.
+    :param pages: An optional list of 1-indexed pages to classify. Defaults to every page.
+    :param profile: A key of RENDER_PROFILES, the resolution pages are rendered and saved at.
+    :param grayscale: Whether to render single-channel images.
+    :return: A dictionary of render statistics for the document, with its page predictions.
+    """
+    start = time.perf_counter()
+    page_count = get_page_count(pdf_path)
+    if pages is None:
+        pages = range(1, page_count + 1)
+    pages = [page for page in pages if 1 <= page <= page_count]
+    size = RENDER_PROFILES[profile]["size"]
+    rendered = 0
+    selected = set(pages)
+    predictions = [
+        (f"{identifier}_page_{page}.png", 0.0)
+        for page in range(1, page_count + 1)
+        if page not in selected
+    ]
+    chunks = [
+        chunk
+        for first, last in contiguous_ranges(pages)
+        for chunk in page_chunks(first, last, chunk_size)
+    ]
+    for first_page, last_page in chunks:
+        images = convert_from_path(
+            pdf_path,
+            fmt="png",
+            first_page=first_page,
+            last_page=last_page,
+            size=size,
+            grayscale=grayscale,
+        )
+        probabilities = _detector.detect_batch(images)
+        for page, img, probability in zip(
+            range(first_page, last_page + 1), images, probabilities
+        ):
+            probability = float(probability)
+            image = f"{identifier}_page_{page}.png"
+            if probability > threshold:
+                review_folder = include_folder
+            elif probability > threshold - review_margin:
+                review_folder = exclude_folder
+            else:
+                review_folder = None
+
+            if review_folder is not None:
+                img_path = os.path.join(review_folder, image)
+                if not os.path.exists(img_path):
+                    img.save(img_path, "png")
+                    rendered += 1
+            img.close()
+            predictions.append((image, probability))
+
+    seconds = time.perf_counter() - start
+    return {
+        "identifier": identifier,
+        "pages": len(pages),
+        "rendered": rendered,
+        "seconds": seconds,
+        "pages_per_second": len(pages) / seconds if seconds else 0.0,
+        "error": None,
+        "predictions": predictions,
+    }
+
+
+def get_pool_size(
+    workers=None,
+    memory_budget=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    worker_bytes=0,
+    page_bytes=PAGE_BYTES,
+):
+    """
+    Sizes the render pool to the number of cores, capped by how many workers fit in the memory
+    budget.
+
+    :param workers: The maximum number of worker processes. Defaults to the number of cores.
+    :param memory_budget: The memory, in bytes, the pool may use. Defaults to the available
+        system memory.
+    :param chunk_size: The number of pages each worker holds in memory at once.
+    :param worker_bytes: Any additional memory, in bytes, each worker holds, e.g. a model.
+    :param page_bytes: The decoded size, in bytes, of one rendered page.
+    :return: The number of worker processes to start.
+    """
+    workers = workers or os.cpu_count() or 1
+    if memory_budget is None:
+        memory_budget = psutil.virtual_memory().available
+    # a worker holds the decoded chunk plus the raw pdftoppm output it was parsed from
+    per_worker = 2 * chunk_size * page_bytes + worker_bytes
+    return int(max(1, min(workers, memory_budget // per_worker)))
+
+
+def run_document_pool(
+    jobs: dict,
+    pool_size: int,
+    desc: str,
+    initializer=None,
+    initargs=(),
+    on_result=None,
+) -> list:
+    """
+    Runs one job per document on a pool of worker processes, collecting their render statistics.
+    A document that raises is reported and recorded with its error rather than stopping the pool.
+
+    :param jobs: A dictionary mapping each identifier to a (function, args) tuple.
+    :param pool_size: The number of worker processes.
+    :param desc: The progress bar description.
+    :param initializer: An optional function run once in each worker process.
+    :param initargs: The arguments passed to the initializer.
+    :param on_result: An optional function called with each successful result as it completes.
+    :return: A list of per-document result dictionaries.
     """
-    Iterates through a DataFrame of PDF files, converting each PDF to images using the convert_pdf_to_images function.
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=pool_size, initializer=initializer, initargs=initargs
+    ) as pool:
+        futures = {
+            pool.submit(fn, *args): identifier
+            for identifier, (fn, args) in jobs.items()
+        }
+        with tqdm(total=len(futures), desc=desc) as pbar:
+            for future in as_completed(futures):
+                identifier = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error converting {identifier}, skipping: {e}")
+                    result = {"identifier": identifier, "pages": 0, "rendered": 0}
+                    result.update(seconds=0.0, pages_per_second=0.0, error=str(e))
+                else:
+                    pbar.set_postfix(
+                        pages_per_second=f"{result['pages_per_second']:.1f}"
+                    )
+                    if on_result is not None:
+                        on_result(result)
+                results.append(result)
+                pbar.update()
+    return results
+
+
+def generate_page_images(
+    df: pd.DataFrame,
+    image_root: str,
+    workers=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    memory_budget=None,
+    profile: str = "full",
+    grayscale: bool = False,
+    pages_only: bool = False,
+    manifest_path=None,
+    candidates=None,
+) -> pd.DataFrame:
+    """
+    Converts each PDF in a DataFrame to images across a pool of worker processes using the
+    convert_pdf_to_images function. When a manifest is given, documents whose requested pages
+    were all rendered by a previous run are skipped without being opened, and the rest render
+    only their missing pages. The manifest is saved as each document completes.
 
     :param df: A DataFrame containing the paths and identifiers of the PDFs to be converted.
     :param image_root: The directory where the images will be saved.
+    :param workers: The maximum number of worker processes. Defaults to the number of cores.
+    :param chunk_size: The number of pages rendered at a time by each worker.
+    :param memory_budget: The memory, in bytes, the pool may use. Defaults to the available
+        system memory.
+    :param profile: A key of RENDER_PROFILES, "full" or "detector" (the model's input size).
+    :param grayscale: Whether to render single-channel images.
+    :param pages_only: Render only the pages in the `pages` column written by map_images_to_pdfs.py.
+    :param manifest_path: An optional path to the render manifest JSON file for image_root.
+    :param candidates: An optional dictionary from load_candidates. Only each document's
+        candidate pages are rendered, or every page for documents flagged for the full path.
+    :return: A DataFrame of per-document render statistics.
     """
+    page_bytes = RENDER_PROFILES[profile]["page_bytes"]
+    pool_size = get_pool_size(workers, memory_budget, chunk_size, page_bytes=page_bytes)
+    manifest = load_manifest(manifest_path) if manifest_path else {}
+    paths = {}
+    jobs = {}
+    for _, row in df.iterrows():
+        pages = None
+        if pages_only:
+            pages = parse_page_string(row.pages)
+            if not pages:
+                continue
+        elif candidates is not None:
+            pages = candidates.get(row.identifier)
 
-    for _, row in tqdm(df.iterrows(), desc="Converting PDFs to images"):
-        path = row.path
-        identifier = row.identifier
-        convert_pdf_to_images(path, identifier, image_root)
+        entry = current_manifest_entry(manifest, row.path, profile, grayscale)
+        if entry is not None:
+            done = set(parse_page_string(entry["pages"]))
+            wanted = pages if pages is not None else range(1, entry["page_count"] + 1)
+            pages = [page for page in wanted if page not in done]
+            if not pages:
+                continue
+        # the PDF or the render settings changed, so its images on disk are stale
+        overwrite = entry is None and str(row.path) in manifest
+
+        paths[row.identifier] = str(row.path)
+        jobs[row.identifier] = (
+            convert_pdf_to_images,
+            (
+                row.path,
+                row.identifier,
+                image_root,
+                chunk_size,
+                profile,
+                grayscale,
+                pages,
+                overwrite,
+            ),
+        )
+    print(f"Skipping {len(df) - len(jobs)} documents that are already rendered.")
+
+    def update_manifest(result):
+        pdf_path = paths[result["identifier"]]
+        entry = current_manifest_entry(manifest, pdf_path, profile, grayscale)
+        done = parse_page_string(entry["pages"]) if entry else []
+        manifest[pdf_path] = {
+            **pdf_fingerprint(pdf_path),
+            "page_count": result["page_count"],
+            "profile": profile,
+            "grayscale": grayscale,
+            "pages": format_page_string(done + result["completed_pages"]),
+        }
+        save_manifest(manifest, manifest_path)
+
+    stats = run_document_pool(
+        jobs,
+        pool_size,
+        desc="Converting PDFs to images",
+        on_result=update_manifest if manifest_path else None,
+    )
+    return pd.DataFrame(stats, columns=STATS_COLUMNS)
+
+
+def stream_page_predictions(
+    df: pd.DataFrame,
+    image_year_root: str,
+    model_weights: str,
+    workers=None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    memory_budget=None,
+    threshold: float = DEFAULT_THRESHOLD,
+    review_margin: float = DEFAULT_REVIEW_MARGIN,
+    backend: str = "torch",
+    prefilter=None,
+    candidates=None,
+    profile: str = "detector",
+    grayscale: bool = False,
+):
+    """
+    Renders and classifies each PDF in a DataFrame across a pool of worker processes using the
+    classify_pdf_pages function. This replaces generate_page_images followed by sort.py.
+
+    :param df: A DataFrame containing the paths and identifiers of the PDFs to be classified.
+    :param image_year_root: PhilAuditStorage/Images/year
+    :param model_weights: The path to the PhilTableDetection checkpoint.
+    :param workers: The maximum number of worker processes. Defaults to the number of cores.
+    :param chunk_size: The number of pages rendered at a time by each worker.
+    :param memory_budget: The memory, in bytes, the pool may use. Defaults to the available
+        system memory.
+    :param threshold: The probability above which a page is included.
+    :param review_margin: The width of the band below the threshold that is kept for review.
+    :param backend: The Detector backend, one of BACKENDS.
+    :param prefilter: An optional RulingLinePrefilter rejecting pages before they reach the model.
+    :param candidates: An optional dictionary from load_candidates. Only each document's
+        candidate pages are classified, or every page for documents flagged for the full path.
+    :param profile: A key of RENDER_PROFILES, the resolution pages are rendered and saved at.
+    :param grayscale: Whether to render single-channel images.
+    :return: A tuple of DataFrames: per-document render statistics and the prediction manifest.
+    """
+    if backend != "torch":
+        # export the ONNX models once here rather than racing to in every worker
+        Detector(model_weights, backend=backend)
+    # the checkpoint size is a fair estimate of a loaded model's footprint
+    model_bytes = os.path.getsize(model_weights)
+    page_bytes = RENDER_PROFILES[profile]["page_bytes"]
+    pool_size = get_pool_size(
+        workers, memory_budget, chunk_size, model_bytes, page_bytes
+    )
+    num_threads = max(1, (os.cpu_count() or 1) // pool_size)
+    include_folder = os.path.join(image_year_root, "Include")
+    exclude_folder = os.path.join(image_year_root, "Exclude")
+    jobs = {
+        row.identifier: (
+            classify_pdf_pages,
+            (
+                row.path,
+                row.identifier,
+                include_folder,
+                exclude_folder,
+                chunk_size,
+                threshold,
+                review_margin,
+                candidates.get(row.identifier) if candidates is not None else None,
+                profile,
+                grayscale,
+            ),
+        )
+        for _, row in df.iterrows()
+    }
+    results = run_document_pool(
+        jobs,
+        pool_size,
+        desc="Classifying PDF pages",
+        initializer=_init_detector,
+        initargs=(model_weights, num_threads, backend, prefilter),
+    )
+    predictions = [p for result in results for p in result.get("predictions", [])]
+    return (
+        pd.DataFrame(results, columns=STATS_COLUMNS),
+        predictions_frame(predictions, checkpoint_id(model_weights, backend)),
+    )
 
 
 def main():
@@ -45,15 +564,138 @@ def main():
     Main function that reads command line arguments for input file and output directory
     and calls the generate_page_images function to convert PDFs to images.
     """
+    parser = argparse.ArgumentParser(
+        description="Convert a year of PDFs to page images."
+    )
+    parser.add_argument("root", help="A year directory from within PhilAuditStorage")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Maximum number of render processes"
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=DEFAULT_CHUNK_SIZE,
+        help="Pages rendered at a time by each process",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Memory, in GB, the render pool may use (default: available memory)",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=sorted(RENDER_PROFILES),
+        default=None,
+        help="Render at full resolution or directly at the detector's input size "
+        "(default: full, or detector with --weights)",
+    )
+    parser.add_argument(
+        "--grayscale", action="store_true", help="Render single-channel images"
+    )
+    parser.add_argument(
+        "--pages-only",
+        action="store_true",
+        help="Render only the metadata `pages` (camelot's target pages) to Images/year/Full",
+    )
+    parser.add_argument(
+        "--weights",
+        default=None,
+        help="Classify pages in memory with this checkpoint instead of writing All",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Probability above which a page is included (with --weights)",
+    )
+    parser.add_argument(
+        "--review-margin",
+        type=float,
+        default=DEFAULT_REVIEW_MARGIN,
+        help="Excluded pages this close to the threshold are kept for review",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="torch",
+        help="Run the checkpoint with torch, as ONNX, or as int8-quantized ONNX",
+    )
+    parser.add_argument(
+        "--prefilter",
+        action="store_true",
+        help="Reject pages without ruling lines before they reach the model",
+    )
+    parser.add_argument(
+        "--min-horizontal",
+        type=float,
+        default=1.0,
+        help="Prefilter: minimum horizontal rule length, in page widths",
+    )
+    parser.add_argument(
+        "--min-vertical",
+        type=float,
+        default=0.2,
+        help="Prefilter: minimum vertical rule length, in page heights",
+    )
+    parser.add_argument(
+        "--candidates",
+        default=None,
+        help="Render only candidate pages from Metadata/<year>_candidates.csv, "
+        "see text_prefilter.py",
+    )
+    args = parser.parse_args()
 
-    root = sys.argv[1]  # Should be a year directory from within PhilAuditStorage
+    root = args.root
     year = Path(root).name
     metadata_root = os.path.join(root, "..", "Metadata")
     metadata_path = os.path.join(metadata_root, f"{year}_metadata.csv")
     metadata_file = pd.read_csv(metadata_path)
-    image_root = os.path.join(root, "..", "Images", year, "All")
-    generate_page_images(df=metadata_file, image_root=image_root)
-    print("Done!")
+    image_year_root = os.path.join(root, "..", "Images", year)
+    memory_budget = args.memory_budget * 1024**3 if args.memory_budget else None
+    candidates = load_candidates(args.candidates) if args.candidates else None
+    prefilter = None
+    if args.prefilter:
+        prefilter = RulingLinePrefilter(args.min_horizontal, args.min_vertical)
+    if args.weights:
+        stats, predictions = stream_page_predictions(
+            df=metadata_file,
+            image_year_root=image_year_root,
+            model_weights=args.weights,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            memory_budget=memory_budget,
+            threshold=args.threshold,
+            review_margin=args.review_margin,
+            backend=args.backend,
+            prefilter=prefilter,
+            candidates=candidates,
+            profile=args.profile or "detector",
+            grayscale=args.grayscale,
+        )
+        write_predictions(
+            predictions, os.path.join(image_year_root, f"{year}_predictions.parquet")
+        )
+    else:
+        image_folder = "Full" if args.pages_only else "All"
+        stats = generate_page_images(
+            df=metadata_file,
+            image_root=os.path.join(image_year_root, image_folder),
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            memory_budget=memory_budget,
+            profile=args.profile or "full",
+            grayscale=args.grayscale,
+            pages_only=args.pages_only,
+            manifest_path=os.path.join(
+                image_year_root, f"{image_folder}_render_manifest.json"
+            ),
+            candidates=candidates,
+        )
+    stats.to_csv(os.path.join(metadata_root, f"{year}_render_stats.csv"), index=False)
+    print(
+        f"Done! {stats.pages.sum():.0f} pages in {stats.seconds.sum():.0f}s of render time."
+    )
 
 
 if __name__ == "__main__":
@@ -1,11 +1,13 @@
+import argparse
 import os
 import re
-import sys
 from pathlib import Path
 
 import pandas as pd
 from tqdm import tqdm
 
+from philaudit.predictions import included_pages, read_predictions
+
 
 def integer_ranges(lst):
     """
@@ -53,6 +55,25 @@ def match_validated_images_to_pdfs(df: pd.DataFrame, images_path: str) -> str:
     return df
 
 
+def match_predictions_to_pdfs(
+    df: pd.DataFrame, predictions: pd.DataFrame, threshold: float
+) -> pd.DataFrame:
+    """
+    Like match_validated_images_to_pdfs, but takes the pages straight from a prediction manifest
+    written by sort.py --manifest, so any threshold can be applied without sorting images.
+
+    :param df: A DataFrame of document metadata including paths and identifiers.
+    :param predictions: A prediction manifest.
+    :param threshold: The probability above which a page is included.
+    :return: A DataFrame with an added 'pages' column representing the pages to be scraped.
+    """
+    pages = included_pages(predictions, threshold)
+    df["pages"] = [
+        integer_ranges(pages.get(identifier, [])) for identifier in df.identifier
+    ]
+    return df
+
+
 def page_str_pg_count(s):
     """
     Counts the total number of pages represented in a string of page ranges.
@@ -75,18 +96,37 @@ def page_str_pg_count(s):
 
 
 def main():
-    root = sys.argv[1]  # Should be a year directory from within PhilAuditStorage
+    parser = argparse.ArgumentParser(description="Map sorted page images to PDFs.")
+    parser.add_argument("root", help="A year directory from within PhilAuditStorage")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=None,
+        help="Take pages above this probability from the prediction manifest "
+        "instead of the Include folder",
+    )
+    args = parser.parse_args()
+
+    root = args.root
     year = Path(root).name
     metadata_root = os.path.join(root, "..", "Metadata")
     metadata_path = os.path.join(metadata_root, f"{year}_metadata.csv")
-    image_root = os.path.join(root, "..", "Images", year, "Include")
+    image_year_root = os.path.join(root, "..", "Images", year)
+    image_root = os.path.join(image_year_root, "Include")
 
     df = pd.read_csv(metadata_path)
-    df = match_validated_images_to_pdfs(df, image_root)
+    if args.threshold is None:
+        df = match_validated_images_to_pdfs(df, image_root)
+    else:
+        predictions = read_predictions(
+            os.path.join(image_year_root, f"{year}_predictions.parquet")
+        )
+        df = match_predictions_to_pdfs(df, predictions, args.threshold)
     df["pg_count"] = df.pages.apply(page_str_pg_count)
     df["pageless"] = df.pg_count.apply(lambda x: x == 0)
     df.to_csv(metadata_path, index=False)
     print("Done! Metadata updated.")
 
 
-main()
+if __name__ == "__main__":
+    main()
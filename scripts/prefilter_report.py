@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+
+from philaudit.prefilter import RulingLinePrefilter, evaluate_prefilter
+
+
+def list_images(folder):
+    """
+    :param folder: A folder of page images.
+    :return: The paths of the png images in the folder.
+    """
+    return sorted(
+        os.path.join(folder, image)
+        for image in os.listdir(folder)
+        if image.endswith(".png")
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the ruling-line prefilter's recall and throughput "
+        "on manually sorted pages."
+    )
+    parser.add_argument(
+        "year_image_root",
+        help="PhilAuditStorage/Images/year, with manually sorted Include and Exclude",
+    )
+    parser.add_argument("--min-horizontal", type=float, default=1.0)
+    parser.add_argument("--min-vertical", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=8, help="Screening threads")
+    parser.add_argument("--output", default=None, help="Path of a JSON report")
+    args = parser.parse_args()
+
+    prefilter = RulingLinePrefilter(args.min_horizontal, args.min_vertical)
+    report = evaluate_prefilter(
+        prefilter,
+        list_images(os.path.join(args.year_image_root, "Include")),
+        list_images(os.path.join(args.year_image_root, "Exclude")),
+        max_workers=args.workers,
+    )
+
+    print(
+        f"Recall {report['recall']:.2%} on {report['include']} table pages, "
+        f"{report['rejection_rate']:.2%} of {report['exclude']} other pages rejected, "
+        f"{report['images_per_second']:.1f} images/s."
+    )
+    print(
+        f"Largest minimums keeping every table page: "
+        f"--min-horizontal {report['safe_min_horizontal']} "
+        f"--min-vertical {report['safe_min_vertical']}"
+    )
+    for path in report["false_rejections"]:
+        print(f"Rejected table page: {path}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -56,6 +56,7 @@ if len(sys.argv) > 1:
         os.makedirs(
             os.path.join(phil_dir, "Images", str(year), "False_negative"), exist_ok=True
         )
+        os.makedirs(os.path.join(phil_dir, "Images", str(year), "Full"), exist_ok=True)
     print("Done!")
 
 
@@ -1,11 +1,26 @@
+import argparse
+import itertools
 import os
 import shutil
-import sys
+import time
+import zlib
+from pathlib import Path
 
+import numpy as np
+import pandas as pd
+import torch
 from PIL import Image
+from torch.utils.data import DataLoader
 from tqdm import tqdm
 
-from philaudit.detector import Detector
+from philaudit.datamodule import PhilPageDataset
+from philaudit.detector import BACKENDS, Detector
+from philaudit.prefilter import RulingLinePrefilter
+from philaudit.prediction_cache import PredictionCache, hash_files
+from philaudit.predictions import predictions_frame, read_predictions, write_predictions
+from philaudit.text_layer import is_candidate, load_candidates
+
+DEFAULT_THRESHOLD = 0.5
 
 
 def sort_images(all, include, exclude, detector):
@@ -29,15 +44,350 @@ def sort_images(all, include, exclude, detector):
             continue
 
 
+def shard_images(images, num_shards, shard_index):
+    """
+    Deterministically assigns images to shards by a hash of their file names, so an image lands
+    in the same shard whatever else is in the folder.
+
+    :param images: A list of image file names.
+    :param num_shards: The total number of shards.
+    :param shard_index: The shard to select.
+    :return: The images belonging to the shard.
+    """
+    return [
+        image
+        for image in images
+        if zlib.crc32(image.encode()) % num_shards == shard_index
+    ]
+
+
+def classify_images(
+    paths, detector, batch_size=32, num_workers=2, prefetch_factor=2, position=0
+):
+    """
+    Classifies images in batches, decoding and transforming them in DataLoader worker processes.
+    If the detector has a cache, images are hashed first and cached predictions are yielded
+    without being decoded. If it has a prefilter, the remaining images are screened by it
+    and rejected images are yielded with a probability of 0 without reaching the model.
+
+    :param paths: A list of image paths.
+    :param detector: A Detector.
+    :param batch_size: The number of images per forward pass.
+    :param num_workers: The number of DataLoader processes decoding images.
+    :param prefetch_factor: The number of batches each worker loads ahead of the model.
+    :param position: The progress bar's line, one per shard.
+    :return: A generator of (path, probability) tuples. Unreadable images have a NaN probability.
+    """
+    keys = None
+    if detector.cache is not None:
+        keys = hash_files(paths)
+        probabilities, missing = detector.lookup(keys)
+        for image_path, probability in zip(paths, probabilities):
+            if not np.isnan(probability):
+                yield image_path, probability
+        paths = [paths[i] for i in missing]
+        keys = [keys[i] for i in missing]
+
+    if detector.prefilter is not None:
+        kept = detector.prefilter.keep_paths(paths)
+        for image_path, keep in zip(paths, kept):
+            if not keep:
+                yield image_path, 0.0
+        if keys is not None:
+            keys = [key for key, keep in zip(keys, kept) if keep]
+        paths = [image_path for image_path, keep in zip(paths, kept) if keep]
+
+    dataset = PhilPageDataset(paths, transforms=detector.transforms)
+    loader = DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor if num_workers > 0 else None,
+        pin_memory=torch.cuda.is_available(),
+    )
+
+    idx = 0
+    with tqdm(
+        total=len(dataset), desc="Sorting Images with AI", position=position
+    ) as pbar:
+        for batch, readable in loader:
+            readable = readable.tolist()
+            batch_keys = None
+            if keys is not None:
+                # unreadable images were replaced by blanks, do not cache those
+                batch_keys = [
+                    key if ok else None
+                    for key, ok in zip(keys[idx : idx + len(batch)], readable)
+                ]
+            probabilities = detector.predict_batch(batch, keys=batch_keys)
+            for probability, ok in zip(probabilities, readable):
+                yield dataset.paths[idx], probability if ok else np.nan
+                idx += 1
+            pbar.update(len(batch))
+
+
+def sort_images_batched(
+    all,
+    include,
+    exclude,
+    detector,
+    batch_size=32,
+    num_workers=2,
+    prefetch_factor=2,
+    num_shards=1,
+    shard_index=0,
+    manifest_path=None,
+    candidates=None,
+):
+    """
+    Sorts images like sort_images, but classifies them in batches with classify_images.
+    Unreadable images are sent to exclude. With a manifest path, no images are moved; each
+    image's probability is written to a Parquet prediction manifest instead, which
+    threshold.py and map_images_to_pdfs.py can apply any threshold to later. With candidates,
+    pages that are not candidates are given a probability of 0 without being classified.
+
+    :param all: PhilAuditStorage/Images/year/All
+    :param include: PhilAuditStorage/Images/year/Include
+    :param exclude: PhilAuditStorage/Images/year/Exclude
+    :param detector: A Detector.
+    :param batch_size: The number of images per forward pass.
+    :param num_workers: The number of DataLoader processes decoding images.
+    :param prefetch_factor: The number of batches each worker loads ahead of the model.
+    :param num_shards: The number of shards All is split into, see shard_images.
+    :param shard_index: The shard sorted by this call.
+    :param manifest_path: An optional path to write the prediction manifest to.
+    :param candidates: An optional dictionary of candidate pages from load_candidates.
+    :return: The measured throughput in images per second.
+    """
+    images = sorted(image for image in os.listdir(all) if image.endswith(".png"))
+    images = shard_images(images, num_shards, shard_index)
+    paths = [os.path.join(all, image) for image in images]
+    skipped = []
+    if candidates is not None:
+        skipped = [path for path in paths if not is_candidate(candidates, path)]
+        paths = [path for path in paths if is_candidate(candidates, path)]
+
+    start = time.perf_counter()
+    records = []
+    predictions = classify_images(
+        paths,
+        detector,
+        batch_size=batch_size,
+        num_workers=num_workers,
+        prefetch_factor=prefetch_factor,
+        position=shard_index,
+    )
+    for image_path, probability in itertools.chain(
+        ((path, 0.0) for path in skipped), predictions
+    ):
+        if manifest_path is not None:
+            records.append((os.path.basename(image_path), probability))
+        elif probability > DEFAULT_THRESHOLD:
+            shutil.move(image_path, include)
+        else:
+            shutil.move(image_path, exclude)
+
+    seconds = time.perf_counter() - start
+    images_per_second = len(images) / seconds if seconds else 0.0
+    print(f"Sorted {len(images)} images at {images_per_second:.1f} images/s.")
+    if detector.cache is not None:
+        stats = detector.cache.stats()
+        print(
+            f"Prediction cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.1%} hit rate), {stats['entries']} entries."
+        )
+    if manifest_path is not None:
+        write_predictions(predictions_frame(records, detector.model_id), manifest_path)
+    return images_per_second
+
+
+def _shard_manifest_path(manifest_path, shard_index):
+    if manifest_path is None:
+        return None
+    return f"{manifest_path}.shard{shard_index}"
+
+
+def _sort_shard(
+    shard_index,
+    num_shards,
+    num_threads,
+    all,
+    include,
+    exclude,
+    detector,
+    manifest_path,
+    kwargs,
+):
+    # spawned processes start with torch's default of one intra-op thread per core
+    torch.set_num_threads(num_threads)
+    sort_images_batched(
+        all,
+        include,
+        exclude,
+        detector,
+        num_shards=num_shards,
+        shard_index=shard_index,
+        manifest_path=_shard_manifest_path(manifest_path, shard_index),
+        **kwargs,
+    )
+
+
+def sort_images_sharded(
+    all, include, exclude, detector, workers, manifest_path=None, **kwargs
+):
+    """
+    Sorts images across `workers` inference processes, each running sort_images_batched on one
+    shard of All. The model's weights are moved to shared memory before the processes start, so
+    every process maps the same weights instead of loading its own copy. Cores are divided evenly
+    between the processes' intra-op thread pools so they do not oversubscribe the machine.
+
+    :param all: PhilAuditStorage/Images/year/All
+    :param include: PhilAuditStorage/Images/year/Include
+    :param exclude: PhilAuditStorage/Images/year/Exclude
+    :param detector: A Detector.
+    :param workers: The number of inference processes.
+    :param manifest_path: An optional path to write the prediction manifest to, instead of
+        moving images. Each shard writes its own part, which are combined at the end.
+    :param kwargs: Keyword arguments passed through to sort_images_batched.
+    :return: The measured throughput of all processes in images per second.
+    """
+    num_images = len([image for image in os.listdir(all) if image.endswith(".png")])
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    detector.share_memory()
+
+    start = time.perf_counter()
+    torch.multiprocessing.spawn(
+        _sort_shard,
+        args=(
+            workers,
+            num_threads,
+            all,
+            include,
+            exclude,
+            detector,
+            manifest_path,
+            kwargs,
+        ),
+        nprocs=workers,
+        join=True,
+    )
+    if manifest_path is not None:
+        parts = [_shard_manifest_path(manifest_path, i) for i in range(workers)]
+        write_predictions(
+            pd.concat([read_predictions(part) for part in parts], ignore_index=True),
+            manifest_path,
+        )
+        for part in parts:
+            os.remove(part)
+    seconds = time.perf_counter() - start
+    images_per_second = num_images / seconds if seconds else 0.0
+    print(
+        f"Sorted {num_images} images with {workers} processes at "
+        f"{images_per_second:.1f} images/s."
+    )
+    return images_per_second
+
+
 def main():
-    year_image_root = sys.argv[1]  # "PhilAuditStorage/Images/year"
-    weights = sys.argv[2]
-
-    all = os.path.join(year_image_root, "All")
-    include = os.path.join(year_image_root, "Include")
-    exclude = os.path.join(year_image_root, "Exclude")
-    detector = Detector(weights)
-    sort_images(all, include, exclude, detector)
+    parser = argparse.ArgumentParser(description="Sort a year of page images.")
+    parser.add_argument("year_image_root", help="PhilAuditStorage/Images/year")
+    parser.add_argument("weights", help="Path to the model weights checkpoint")
+    parser.add_argument(
+        "--batch-size", type=int, default=32, help="Images per forward pass"
+    )
+    parser.add_argument(
+        "--num-workers", type=int, default=2, help="DataLoader decoding processes"
+    )
+    parser.add_argument(
+        "--prefetch-factor",
+        type=int,
+        default=2,
+        help="Batches each decoding process loads ahead",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Inference processes, each sorting one shard of All",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="torch",
+        help="Run the checkpoint with torch, as ONNX, or as int8-quantized ONNX",
+    )
+    parser.add_argument(
+        "--cache",
+        default=None,
+        help="SQLite prediction cache, e.g. PhilAuditStorage/prediction_cache.sqlite",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=5_000_000,
+        help="Maximum number of cached predictions before the oldest are evicted",
+    )
+    parser.add_argument(
+        "--manifest",
+        action="store_true",
+        help="Write probabilities to Images/year/<year>_predictions.parquet "
+        "instead of moving images, see threshold.py",
+    )
+    parser.add_argument(
+        "--prefilter",
+        action="store_true",
+        help="Reject pages without ruling lines before they reach the model",
+    )
+    parser.add_argument(
+        "--min-horizontal",
+        type=float,
+        default=1.0,
+        help="Prefilter: minimum horizontal rule length, in page widths",
+    )
+    parser.add_argument(
+        "--min-vertical",
+        type=float,
+        default=0.2,
+        help="Prefilter: minimum vertical rule length, in page heights",
+    )
+    parser.add_argument(
+        "--candidates",
+        default=None,
+        help="Classify only candidate pages from Metadata/<year>_candidates.csv, "
+        "see text_prefilter.py",
+    )
+    args = parser.parse_args()
+
+    all = os.path.join(args.year_image_root, "All")
+    include = os.path.join(args.year_image_root, "Include")
+    exclude = os.path.join(args.year_image_root, "Exclude")
+    cache = PredictionCache(args.cache, args.cache_size) if args.cache else None
+    prefilter = None
+    if args.prefilter:
+        prefilter = RulingLinePrefilter(args.min_horizontal, args.min_vertical)
+    detector = Detector(
+        args.weights, backend=args.backend, cache=cache, prefilter=prefilter
+    )
+    manifest_path = None
+    if args.manifest:
+        year = Path(args.year_image_root).name
+        manifest_path = os.path.join(
+            args.year_image_root, f"{year}_predictions.parquet"
+        )
+    loader_kwargs = dict(
+        batch_size=args.batch_size,
+        num_workers=args.num_workers,
+        prefetch_factor=args.prefetch_factor,
+        manifest_path=manifest_path,
+        candidates=load_candidates(args.candidates) if args.candidates else None,
+    )
+    if args.workers > 1:
+        sort_images_sharded(
+            all, include, exclude, detector, args.workers, **loader_kwargs
+        )
+    else:
+        sort_images_batched(all, include, exclude, detector, **loader_kwargs)
     print("Done!")
 
 
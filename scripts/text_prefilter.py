@@ -0,0 +1,97 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+from tqdm import tqdm
+
+from philaudit.pages import parse_page_string
+from philaudit.text_layer import (
+    CANDIDATE_COLUMNS,
+    DEFAULT_MARGIN,
+    DEFAULT_MIN_SCORE,
+    scan_pdf,
+)
+
+
+def scan_pdfs(df, workers=None, min_score=DEFAULT_MIN_SCORE, margin=DEFAULT_MARGIN):
+    """
+    Scans the text layer of each PDF in a DataFrame across a pool of worker processes using
+    the scan_pdf function. A document that cannot be parsed is flagged for the full path.
+
+    :param df: A DataFrame containing the paths and identifiers of the PDFs to be scanned.
+    :param workers: The number of worker processes. Defaults to the number of cores.
+    :param min_score: The keyword score a page needs to be a candidate.
+    :param margin: The number of neighbouring pages added on each side of a hit.
+    :return: A DataFrame with CANDIDATE_COLUMNS, one row per document, in metadata order.
+    """
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(scan_pdf, row.path, row.identifier, min_score, margin): row
+            for _, row in df.iterrows()
+        }
+        for future in tqdm(
+            as_completed(futures), total=len(futures), desc="Scanning text layers"
+        ):
+            row = futures[future]
+            try:
+                results[row.identifier] = future.result()
+            except Exception as e:
+                print(f"Error scanning {row.identifier}, using the full path: {e}")
+                results[row.identifier] = {
+                    "identifier": row.identifier,
+                    "path": row.path,
+                    "image_only": False,
+                    "full_path": True,
+                    "candidates": "",
+                }
+    return pd.DataFrame(
+        [results[identifier] for identifier in df.identifier],
+        columns=CANDIDATE_COLUMNS,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Find candidate table pages from the PDFs' text layers."
+    )
+    parser.add_argument("root", help="A year directory from within PhilAuditStorage")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of scanning processes"
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=DEFAULT_MIN_SCORE,
+        help="Keyword score a page needs to be a candidate",
+    )
+    parser.add_argument(
+        "--margin",
+        type=int,
+        default=DEFAULT_MARGIN,
+        help="Neighbouring pages added on each side of a candidate",
+    )
+    args = parser.parse_args()
+
+    year = Path(args.root).name
+    metadata_root = os.path.join(args.root, "..", "Metadata")
+    df = pd.read_csv(os.path.join(metadata_root, f"{year}_metadata.csv"))
+    candidates = scan_pdfs(df, args.workers, args.min_score, args.margin)
+    candidates_path = os.path.join(metadata_root, f"{year}_candidates.csv")
+    candidates.to_csv(candidates_path, index=False)
+
+    scanned = candidates[~candidates.full_path]
+    num_candidates = scanned.candidates.map(lambda s: len(parse_page_string(s))).sum()
+    print(
+        f"{len(scanned)} of {len(candidates)} documents have candidate pages: "
+        f"{num_candidates} of their {scanned.page_count.sum():.0f} pages. "
+        f"{candidates.image_only.sum()} documents are image-only and "
+        f"{candidates.full_path.sum()} will be rendered in full."
+    )
+    print(f"Done! Candidates written to {candidates_path}")
+
+
+if __name__ == "__main__":
+    main()
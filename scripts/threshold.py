@@ -0,0 +1,84 @@
+import argparse
+import os
+from pathlib import Path
+
+from philaudit.predictions import read_predictions
+
+
+def clear_links(folder):
+    """
+    Removes the symlinks left in a folder by a previous materialize call. Real files, e.g. images
+    moved there by sort.py, are left alone.
+
+    :param folder: The folder to clear.
+    """
+    for image in os.listdir(folder):
+        path = os.path.join(folder, image)
+        if os.path.islink(path):
+            os.remove(path)
+
+
+def materialize(predictions, all, include, exclude, threshold):
+    """
+    Lays out Include and Exclude as symlinks into All for a threshold, without running inference
+    or moving any images. Re-running with another threshold replaces the previous links.
+
+    :param predictions: A prediction manifest written by sort.py --manifest.
+    :param all: PhilAuditStorage/Images/year/All
+    :param include: PhilAuditStorage/Images/year/Include
+    :param exclude: PhilAuditStorage/Images/year/Exclude
+    :param threshold: The probability above which a page is included.
+    :return: A dictionary counting included, excluded and missing images.
+    """
+    clear_links(include)
+    clear_links(exclude)
+    counts = {"included": 0, "excluded": 0, "missing": 0}
+    for row in predictions.itertuples(index=False):
+        source = os.path.abspath(os.path.join(all, row.image))
+        if not os.path.exists(source):
+            counts["missing"] += 1
+            continue
+
+        if row.probability > threshold:
+            folder, count = include, "included"
+        else:
+            folder, count = exclude, "excluded"
+        link = os.path.join(folder, row.image)
+        if not os.path.lexists(link):
+            os.symlink(source, link)
+        counts[count] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Materialize Include/Exclude from a prediction manifest."
+    )
+    parser.add_argument("year_image_root", help="PhilAuditStorage/Images/year")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.5,
+        help="Probability above which a page is included",
+    )
+    args = parser.parse_args()
+
+    year = Path(args.year_image_root).name
+    predictions = read_predictions(
+        os.path.join(args.year_image_root, f"{year}_predictions.parquet")
+    )
+    counts = materialize(
+        predictions,
+        os.path.join(args.year_image_root, "All"),
+        os.path.join(args.year_image_root, "Include"),
+        os.path.join(args.year_image_root, "Exclude"),
+        args.threshold,
+    )
+    print(
+        f"Done! {counts['included']} pages included and {counts['excluded']} excluded "
+        f"at threshold {args.threshold}. {counts['missing']} images were not in All."
+    )
+
+
+if __name__ == "__main__":
+    main()
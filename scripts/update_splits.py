@@ -0,0 +1,31 @@
+import argparse
+
+from philaudit.splits import update_split_manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Assign new labelled images to the train, val and test splits, "
+        "keeping the split of every image already in the manifest."
+    )
+    parser.add_argument("data_root", help="Training data folder, one folder per class")
+    parser.add_argument(
+        "--manifest", default="./splits.csv", help="CSV file holding the splits"
+    )
+    parser.add_argument(
+        "--val-split", type=float, default=0.2, help="Share of new images for val"
+    )
+    parser.add_argument(
+        "--test-split", type=float, default=0.1, help="Share of new images for test"
+    )
+    args = parser.parse_args()
+
+    manifest = update_split_manifest(
+        args.data_root, args.manifest, args.val_split, args.test_split
+    )
+    print(manifest.groupby(["split", "label"]).size().unstack(fill_value=0))
+    print(f"Done! {len(manifest)} images written to {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()